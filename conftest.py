@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def private_cache():
+    """Тесты не трогают общий кеш сайта."""
+    from core.runner import private_cache
+
+    with private_cache():
+        yield
@@ -1,9 +1,20 @@
+from django.utils.decorators import method_decorator
 from django.views.generic.base import TemplateView
 
+from posts.utils import versioned
 
+# Статические страницы зависят только от общей версии кеша, но меню
+# в шапке у каждого посетителя свое.
+static_page = method_decorator(
+    versioned(lambda request: (), per_user=True), name='dispatch'
+)
+
+
+@static_page
 class AboutAuthorView(TemplateView):
     template_name = 'about/author.html'
 
 
+@static_page
 class AboutTechView(TemplateView):
     template_name = 'about/tech.html'
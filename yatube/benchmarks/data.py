@@ -0,0 +1,86 @@
+"""Генератор тестовых данных для замеров.
+
+Популярность авторов, групп и постов распределена по закону Ципфа:
+немногие авторы пишут большую часть постов и собирают большую часть
+подписчиков и комментариев, как в живой соцсети.
+"""
+import random
+from dataclasses import dataclass, field
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from mixer.backend.django import mixer
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@dataclass
+class Dataset:
+    users: list = field(default_factory=list)
+    groups: list = field(default_factory=list)
+    posts: list = field(default_factory=list)
+
+    def sizes(self):
+        return {
+            'users': len(self.users),
+            'groups': len(self.groups),
+            'posts': len(self.posts),
+            'comments': Comment.objects.count(),
+            'follows': Follow.objects.count(),
+        }
+
+
+class ZipfChooser:
+    """Случайный выбор, при котором k-й элемент в k^s раз реже первого."""
+
+    def __init__(self, items, exponent=1.1, rng=random):
+        self.items = items
+        self.rng = rng
+        self.weights = list(accumulate(
+            1 / (rank ** exponent) for rank in range(1, len(items) + 1)
+        ))
+
+    def __call__(self):
+        return self.rng.choices(self.items, cum_weights=self.weights)[0]
+
+    def stream(self):
+        while True:
+            yield self()
+
+
+def generate(users=100, groups=10, posts=1000, comments=2000, follows=500,
+             seed=None):
+    """Создает данные через mixer, поэтому срабатывают все сигналы
+    и счетчики, ленты и кеши заполняются как при реальной работе.
+    """
+    rng = random.Random(seed)
+    dataset = Dataset()
+    dataset.users = mixer.cycle(users).blend(
+        User, username=mixer.sequence('bench{0}')
+    )
+    dataset.groups = mixer.cycle(groups).blend(
+        Group, slug=mixer.sequence('bench-group-{0}')
+    )
+    author = ZipfChooser(dataset.users, rng=rng)
+    group = ZipfChooser(dataset.groups + [None], rng=rng)
+    dataset.posts = mixer.cycle(posts).blend(
+        Post, author=author.stream(), group=group.stream(), image=''
+    )
+    pairs = set()
+    attempts = 0
+    while len(pairs) < follows and attempts < follows * 10:
+        attempts += 1
+        pair = (rng.choice(dataset.users), author())
+        if pair[0] != pair[1]:
+            pairs.add(pair)
+    for user, followed in pairs:
+        Follow.objects.create(user=user, author=followed)
+    if dataset.posts:
+        post = ZipfChooser(dataset.posts, rng=rng)
+        commenter = ZipfChooser(dataset.users, exponent=0, rng=rng)
+        mixer.cycle(comments).blend(
+            Comment, post=post.stream(), author=commenter.stream()
+        )
+    return dataset
@@ -0,0 +1,177 @@
+"""Нагрузочный прогон страниц yatube через тестовый клиент Django.
+
+Каждый поток работает со своим клиентом и своим соединением с базой,
+для каждого запроса замеряются время ответа и число SQL-запросов.
+"""
+import math
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.utils import FORWARD, CursorPaginator
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    # Функция (dataset, rng) -> (адрес, данные формы)
+    request: object
+    login: bool = False
+    write: bool = False
+
+
+def _random_post(dataset, rng):
+    return rng.choice(dataset.posts)
+
+
+def _deep_index(dataset, rng):
+    """Главная страница с курсором из второй половины ленты."""
+    posts = sorted(
+        dataset.posts, key=lambda post: (post.pub_date, post.id), reverse=True
+    )
+    post = rng.choice(posts[len(posts) // 2:])
+    paginator = CursorPaginator(
+        type(post).objects.all(), settings.POST_PER_PAGE
+    )
+    return reverse('posts:index'), {
+        'cursor': paginator.encode_cursor(post, FORWARD)
+    }
+
+
+SCENARIOS = [
+    Scenario('index', 'get', lambda d, r: (reverse('posts:index'), None)),
+    Scenario('index_deep', 'get', _deep_index),
+    Scenario('group_index', 'get', lambda d, r: (
+        reverse('posts:group_index'), None
+    )),
+    Scenario('group_posts', 'get', lambda d, r: (
+        reverse('posts:group_list', args=(r.choice(d.groups).slug,)), None
+    )),
+    Scenario('profile', 'get', lambda d, r: (
+        reverse('posts:profile', args=(r.choice(d.users).username,)), None
+    )),
+    Scenario('post_detail', 'get', lambda d, r: (
+        reverse('posts:post_detail', args=(_random_post(d, r).id,)), None
+    )),
+    Scenario('follow_index', 'get', lambda d, r: (
+        reverse('posts:follow_index'), None
+    ), login=True),
+    Scenario('post_create', 'post', lambda d, r: (
+        reverse('posts:post_create'), {'text': 'Пост из замера'}
+    ), login=True, write=True),
+    Scenario('add_comment', 'post', lambda d, r: (
+        reverse('posts:add_comment', args=(_random_post(d, r).id,)),
+        {'text': 'Комментарий из замера'}
+    ), login=True, write=True),
+    Scenario('profile_follow', 'get', lambda d, r: (
+        reverse('posts:profile_follow', args=(r.choice(d.users).username,)),
+        None
+    ), login=True, write=True),
+]
+
+
+@dataclass
+class Measurements:
+    latencies: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+    errors: int = 0
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+class Harness:
+
+    def __init__(self, dataset, scenarios=None, requests=100, concurrency=4,
+                 seed=None):
+        self.dataset = dataset
+        self.scenarios = scenarios or SCENARIOS
+        self.requests = requests
+        self.concurrency = concurrency
+        self.seed = seed
+        self.local = threading.local()
+
+    def _client(self, rng):
+        if not hasattr(self.local, 'client'):
+            self.local.client = Client()
+            self.local.client.force_login(rng.choice(self.dataset.users))
+        return self.local.client
+
+    def _call(self, scenario, rng):
+        client = self._client(rng) if scenario.login else Client()
+        path, data = scenario.request(self.dataset, rng)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, scenario.method)(path, data)
+            elapsed = time.perf_counter() - started
+        return elapsed * 1000, len(queries), response.status_code < 400
+
+    def _worker(self, scenario, count, seed):
+        rng = random.Random(seed)
+        results = Measurements()
+        try:
+            for _ in range(count):
+                latency, queries, ok = self._call(scenario, rng)
+                results.latencies.append(latency)
+                results.queries.append(queries)
+                results.errors += not ok
+        finally:
+            close_old_connections()
+        return results
+
+    def workers(self, scenario):
+        # SQLite допускает только одного писателя: параллельные
+        # транзакции записи падали бы с «database is locked».
+        if scenario.write and connection.vendor == 'sqlite':
+            return 1
+        return self.concurrency
+
+    def run_scenario(self, scenario):
+        workers = self.workers(scenario)
+        per_worker = max(self.requests // workers, 1)
+        base_seed = self.seed if self.seed is not None else time.time_ns()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(workers) as pool:
+            parts = list(pool.map(
+                lambda number: self._worker(
+                    scenario, per_worker, base_seed + number
+                ),
+                range(workers)
+            ))
+        elapsed = time.perf_counter() - started
+        total = Measurements()
+        for part in parts:
+            total.latencies += part.latencies
+            total.queries += part.queries
+            total.errors += part.errors
+        return {
+            'requests': len(total.latencies),
+            'errors': total.errors,
+            'p50_ms': round(percentile(total.latencies, 50), 3),
+            'p95_ms': round(percentile(total.latencies, 95), 3),
+            'p99_ms': round(percentile(total.latencies, 99), 3),
+            'queries_per_request': round(statistics.mean(total.queries), 2),
+            'throughput_rps': round(len(total.latencies) / elapsed, 2),
+        }
+
+    def run(self):
+        return {
+            scenario.name: self.run_scenario(scenario)
+            for scenario in self.scenarios
+        }
@@ -0,0 +1,143 @@
+import json
+import os
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+
+from benchmarks import data
+from benchmarks.harness import SCENARIOS, Harness
+from posts.cache import stats_buffer
+
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request',
+            'throughput_rps')
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет временную базу данными с распределением Ципфа '
+        'и замеряет время ответа и число запросов основных страниц'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=500)
+        parser.add_argument(
+            '--requests', type=int, default=100,
+            help='Сколько запросов выполнить для каждой страницы'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Число одновременных клиентов'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            choices=[scenario.name for scenario in SCENARIOS],
+            help='Замерить только указанные страницы'
+        )
+        parser.add_argument(
+            '--use-existing', action='store_true',
+            help='Работать с настроенной базой вместо временной'
+        )
+        parser.add_argument('--output', help='Сохранить результат в JSON')
+        parser.add_argument(
+            '--compare', help='Сравнить с результатом прошлого запуска'
+        )
+
+    def handle(self, *args, **options):
+        if options['use_existing']:
+            report = self.run(options)
+        else:
+            report = self.run_on_temporary_database(options)
+        content = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(content)
+        self.stdout.write(content)
+        if options['compare']:
+            with open(options['compare']) as previous:
+                self.compare(json.load(previous), report)
+
+    def run_on_temporary_database(self, options):
+        # Файловая база, а не в памяти: рабочие потоки открывают
+        # собственные соединения и должны видеть те же данные.
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connection.settings_dict['TEST']['NAME'] = path
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        # Свой кеш в памяти: страницы и версии временной базы не должны
+        # попасть под ключи работающего сайта в общем кеше.
+        private_cache = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'benchmark',
+        }})
+        try:
+            with private_cache:
+                try:
+                    return self.run(options)
+                finally:
+                    # Счетчики замеров остаются в своем кеше.
+                    stats_buffer.flush()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, options):
+        dataset = data.generate(
+            users=options['users'], groups=options['groups'],
+            posts=options['posts'], comments=options['comments'],
+            follows=options['follows'], seed=options['seed']
+        )
+        names = options['scenarios']
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if not names or scenario.name in names
+        ]
+        harness = Harness(
+            dataset, scenarios, requests=options['requests'],
+            concurrency=options['concurrency'], seed=options['seed']
+        )
+        return {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': timezone.now().isoformat(),
+                'dataset': dataset.sizes(),
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+            },
+            'results': harness.run(),
+        }
+
+    def compare(self, previous, current):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Сравнение с {previous["meta"].get("commit")}'
+        ))
+        for name, result in current['results'].items():
+            before = previous['results'].get(name)
+            if before is None:
+                continue
+            deltas = []
+            for metric in COMPARED:
+                old, new = before[metric], result[metric]
+                change = (new - old) / old * 100 if old else 0.0
+                deltas.append(f'{metric} {old} -> {new} ({change:+.1f}%)')
+            self.stdout.write(f'{name}: ' + ', '.join(deltas))
@@ -0,0 +1,50 @@
+import random
+from collections import Counter
+
+from django.test import SimpleTestCase, TransactionTestCase
+
+from posts.models import Comment, Follow, Post
+from ..data import ZipfChooser, generate
+from ..harness import SCENARIOS, Harness, percentile
+
+
+class ZipfChooserTest(SimpleTestCase):
+
+    def test_first_items_popular(self):
+        """Первые элементы выбираются чаще последних"""
+        chooser = ZipfChooser(list(range(10)), rng=random.Random(1))
+        counts = Counter(chooser() for _ in range(2000))
+        self.assertGreater(counts[0], counts[9] * 3)
+
+    def test_percentile(self):
+        """Перцентиль считается по ближайшему рангу"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 95), 0.0)
+
+
+class HarnessTest(TransactionTestCase):
+
+    def test_generate_and_measure(self):
+        """Генератор заполняет базу, замер возвращает метрики страниц"""
+        dataset = generate(
+            users=5, groups=2, posts=20, comments=10, follows=4, seed=1
+        )
+        self.assertEqual(Post.objects.count(), 20)
+        self.assertEqual(Comment.objects.count(), 10)
+        self.assertEqual(Follow.objects.count(), 4)
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if scenario.name in ('index', 'index_deep', 'add_comment')
+        ]
+        results = Harness(
+            dataset, scenarios, requests=4, concurrency=2, seed=1
+        ).run()
+        self.assertEqual(set(results), {'index', 'index_deep', 'add_comment'})
+        for name, result in results.items():
+            with self.subTest(name=name):
+                self.assertEqual(result['errors'], 0)
+                self.assertEqual(result['requests'], 4)
+                self.assertGreater(result['queries_per_request'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
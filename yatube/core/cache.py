@@ -0,0 +1,230 @@
+"""Общий для всех процессов кеш.
+
+LocMemCache у каждого процесса свой: с ростом числа процессов падает
+доля попаданий, а каждый процесс заново строит одни и те же фрагменты.
+SQLiteCache хранит кеш в отдельном файле SQLite, который видят все
+процессы на машине, и не требует внешних служб. Несколько машин
+используют memcached или redis, заданные через CACHE_URL.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMES = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.cache.SQLiteCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    # Требует пакет django-redis.
+    'redis': 'django_redis.cache.RedisCache',
+}
+
+
+def cache_from_url(url):
+    """Настройки кеша из адреса вида sqlite:///path, file:///path,
+    memcached://host:port, redis://host:port/db или locmem://.
+    """
+    parts = urlsplit(url)
+    config = {'BACKEND': SCHEMES[parts.scheme]}
+    if parts.scheme in ('file', 'sqlite'):
+        config['LOCATION'] = parts.path
+    elif parts.scheme == 'memcached':
+        config['LOCATION'] = parts.netloc.split(',')
+    elif parts.scheme == 'redis':
+        config['LOCATION'] = url
+    return config
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в таблице отдельного файла SQLite.
+
+    Журнал WAL позволяет читать, пока другой процесс пишет, поэтому
+    чтение фрагментов не ждет записи. Соединение у каждого потока свое.
+    """
+    # Как часто запись проверяет переполнение кеша.
+    CULL_EVERY = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def _connection(self):
+        # После fork соединение родителя использовать нельзя.
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.connection = None
+            self._local.pid = os.getpid()
+        connection = self._local.connection
+        if connection is None:
+            directory = os.path.dirname(self.location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.location, timeout=5, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB, expires REAL'
+                ') WITHOUT ROWID'
+            )
+            self._local.connection = connection
+        return connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _rows(self, keys):
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        return {
+            key: pickle.loads(value)
+            for key, value, expires in self._connection.execute(
+                f'SELECT key, value, expires FROM cache '
+                f'WHERE key IN ({placeholders})',
+                keys
+            )
+            if expires is None or expires > now
+        }
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._rows([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        names = {self._key(key, version): key for key in keys}
+        if not names:
+            return {}
+        return {
+            names[key]: value
+            for key, value in self._rows(list(names)).items()
+        }
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return key in self._rows([key])
+
+    def _write(self, rows):
+        rows = [
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+            for key, value, expires in rows
+        ]
+        with self._transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)', rows
+            )
+        self._writes += 1
+        if self._writes % self.CULL_EVERY == 0:
+            self._cull()
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write([(self._key(key, version), value, self._expires(timeout))])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        self._write(
+            (self._key(key, version), value, expires)
+            for key, value in data.items()
+        )
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'INSERT INTO cache VALUES (?, ?, ?) ON CONFLICT (key) '
+                'DO UPDATE SET value = excluded.value, '
+                'expires = excluded.expires '
+                'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                 self._expires(timeout), time.time())
+            )
+            return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self._expires(timeout), key, time.time())
+            )
+            return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        # Чтение и запись в одной транзакции: счетчики увеличивают
+        # сразу несколько процессов.
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or row[1] is not None and row[1] <= time.time():
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key)
+            )
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [(self._key(key, version),) for key in keys]
+        with self._transaction() as connection:
+            connection.executemany('DELETE FROM cache WHERE key = ?', keys)
+
+    def clear(self):
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение с файлом кеша живет все время жизни потока.
+        pass
+
+    def _cull(self):
+        with self._transaction() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+            )
+            count, = connection.execute(
+                'SELECT COUNT(*) FROM cache'
+            ).fetchone()
+            if count > self._max_entries and not self._cull_frequency:
+                connection.execute('DELETE FROM cache')
+            elif count > self._max_entries:
+                connection.execute(
+                    'DELETE FROM cache WHERE key IN ('
+                    'SELECT key FROM cache ORDER BY expires IS NULL, '
+                    'expires LIMIT ?)',
+                    (count // self._cull_frequency,)
+                )
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE сразу берет блокировку записи: иначе
+        # параллельный incr получает SQLITE_BUSY без ожидания.
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.routers import sync_replicas
+
+
+class Command(BaseCommand):
+    help = 'Копирует базу default в локальные реплики SQLite'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'aliases', nargs='*',
+            help='Псевдонимы реплик, по умолчанию DATABASE_REPLICAS'
+        )
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or None
+        sync_replicas(aliases)
+        self.stdout.write(self.style.SUCCESS('Реплики обновлены'))
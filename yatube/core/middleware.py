@@ -0,0 +1,74 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from . import profiling
+from .routers import PIN_COOKIE
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class ProfilingMiddleware:
+    """Замеряет SQL, шаблоны и кеш каждого запроса.
+
+    При PROFILING_ENABLED = False Django исключает middleware из цепочки
+    и запросы не несут никаких накладных расходов.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        profiling.install_template_hook()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = profiling.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            profiling.stop()
+        summary = profile.summary()
+        response['Server-Timing'] = profile.server_timing(summary)
+        profiling.report.add(self.view_name(request), summary)
+        return response
+
+    def view_name(self, request):
+        # Кеш страниц отдает страницу, не разбирая адрес.
+        match = request.resolver_match
+        if match is None:
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                return 'не найдено'
+        return match.view_name
+
+
+class PrimaryPinMiddleware:
+    """После изменяющего запроса закрепляет чтение за default.
+
+    Cookie живет REPLICA_STICKY_SECONDS — дольше ожидаемого отставания
+    реплик, — и на это время пользователь видит свои изменения.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (request.method not in SAFE_METHODS
+                or getattr(request, 'primary_pin', False)):
+            window = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                PIN_COOKIE, f'{time.time() + window:.3f}',
+                max_age=window, httponly=True, samesite='Lax'
+            )
+        return response
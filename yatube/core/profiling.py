@@ -0,0 +1,169 @@
+"""Профилирование запросов: SQL, шаблоны и кеш фрагментов.
+
+ProfilingMiddleware заводит RequestProfile на время запроса. Обертка
+execute_wrapper считает SQL-запросы, их время и повторы, обертка
+Template.render — время отрисовки шаблонов без SQL, выполненного
+внутри них, posts.cache сообщает о попаданиях и промахах кеша.
+Итоги уходят в заголовок Server-Timing и в скользящий отчет по
+представлениям, который видят сотрудники на странице admin/profiling/.
+"""
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from functools import wraps
+
+from django.conf import settings
+from django.template.base import Template
+
+_local = threading.local()
+
+
+class RequestProfile:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = Counter()
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries[(sql, repr(params))] += 1
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.queries.values())
+
+    def summary(self):
+        return {
+            'total': time.perf_counter() - self.started,
+            'queries': self.query_count,
+            'duplicates': self.duplicates,
+            'sql': self.sql_time,
+            'templates': self.template_time,
+            'cache_hits': self.cache['hit'],
+            'cache_misses': self.cache['miss'],
+        }
+
+    @staticmethod
+    def server_timing(summary):
+        return ', '.join((
+            'sql;dur={:.1f};desc="{} queries, {} duplicates"'.format(
+                summary['sql'] * 1000, summary['queries'],
+                summary['duplicates']
+            ),
+            'tpl;dur={:.1f}'.format(summary['templates'] * 1000),
+            'cache;desc="{} hits, {} misses"'.format(
+                summary['cache_hits'], summary['cache_misses']
+            ),
+            'total;dur={:.1f}'.format(summary['total'] * 1000),
+        ))
+
+
+def start():
+    _local.profile = RequestProfile()
+    return _local.profile
+
+
+def stop():
+    _local.profile = None
+
+
+def current():
+    return getattr(_local, 'profile', None)
+
+
+def record_cache(event, count=1):
+    profile = current()
+    if profile is not None:
+        profile.cache[event] += count
+
+
+def _profiled(render):
+    @wraps(render)
+    def wrapper(self, context):
+        profile = current()
+        if profile is None:
+            return render(self, context)
+        # Вложенные шаблоны (include, extends) уже входят во время
+        # внешнего, а SQL ленивых querysets учитывается отдельно.
+        profile.template_depth += 1
+        started = time.perf_counter()
+        sql_before = profile.sql_time
+        try:
+            return render(self, context)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_time += (
+                    time.perf_counter() - started
+                    - (profile.sql_time - sql_before)
+                )
+    wrapper.profiled = True
+    return wrapper
+
+
+def install_template_hook():
+    if not getattr(Template.render, 'profiled', False):
+        Template.render = _profiled(Template.render)
+
+
+class Report:
+    """Последние замеры каждого представления."""
+
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=self.window))
+
+    def add(self, view, summary):
+        with self.lock:
+            self.samples[view].append(summary)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def rows(self):
+        with self.lock:
+            samples = {
+                view: list(items) for view, items in self.samples.items()
+            }
+        rows = []
+        for view, items in samples.items():
+            totals = sorted(item['total'] for item in items)
+            rows.append({
+                'view': view,
+                'requests': len(items),
+                'total_mean': statistics.mean(totals) * 1000,
+                'total_p95': totals[int(0.95 * (len(totals) - 1))] * 1000,
+                **{
+                    key: statistics.mean(item[key] for item in items)
+                    for key in ('queries', 'duplicates', 'cache_hits',
+                                'cache_misses')
+                },
+                'sql_mean': statistics.mean(
+                    item['sql'] for item in items
+                ) * 1000,
+                'templates_mean': statistics.mean(
+                    item['templates'] for item in items
+                ) * 1000,
+            })
+        return sorted(
+            rows, key=lambda row: row['total_mean'] * row['requests'],
+            reverse=True
+        )
+
+
+report = Report(settings.PROFILING_WINDOW)
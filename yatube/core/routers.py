@@ -0,0 +1,89 @@
+"""Чтение лент с реплик базы данных.
+
+ReplicaRouter отправляет все записи в default. Чтение уходит на одну
+из DATABASE_REPLICAS только внутри представлений, отмеченных
+read_from_replica, остальные представления читают default. После
+запроса, изменяющего данные, PrimaryPinMiddleware ставит cookie, и
+в течение REPLICA_STICKY_SECONDS ленты этого пользователя читаются
+из default: реплика может еще не получить его запись.
+"""
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+PIN_COOKIE = 'primary_until'
+PRIMARY = 'default'
+# Сессия нужна сразу после входа, поэтому всегда читается из default.
+PRIMARY_APPS = ('sessions',)
+
+_local = threading.local()
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return PRIMARY
+        return getattr(_local, 'replica', None) or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии default, поэтому связи между ними допустимы.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Реплики получают схему вместе с данными от default.
+        return db == PRIMARY
+
+
+def using_replica():
+    return getattr(_local, 'replica', None) is not None
+
+
+def is_pinned(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def pin_to_primary(request):
+    """Закрепляет чтение за default после запроса GET, который изменил
+    данные: PrimaryPinMiddleware сам видит только остальные методы.
+    """
+    request.primary_pin = True
+
+
+def read_from_replica(view):
+    """Читает данные представления с реплики, если она настроена
+    и пользователь недавно ничего не менял.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.DATABASE_REPLICAS or is_pinned(request):
+            return view(request, *args, **kwargs)
+        _local.replica = random.choice(settings.DATABASE_REPLICAS)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _local.replica = None
+    return wrapper
+
+
+def sync_replicas(aliases=None):
+    """Копирует default в реплики SQLite целиком.
+
+    Заменяет репликацию при локальной разработке и в тестах.
+    """
+    primary = connections[PRIMARY]
+    primary.ensure_connection()
+    for alias in aliases or settings.DATABASE_REPLICAS:
+        replica = connections[alias]
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
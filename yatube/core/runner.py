@@ -0,0 +1,40 @@
+"""Запуск тестов с кешем процесса.
+
+Тесты очищают кеш и пишут в него фрагменты тестовой базы, поэтому
+общий кеш сайта (CACHE_URL) им не подходит. TestRunner для manage.py
+test и фикстура в conftest.py для pytest подменяют его на LocMemCache.
+"""
+from contextlib import ExitStack, contextmanager
+
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+}
+
+
+@contextmanager
+def private_cache():
+    with override_settings(CACHES=TEST_CACHES):
+        try:
+            yield
+        finally:
+            # Иначе счетчики попаданий перенесутся в общий кеш при выходе.
+            from posts.cache import stats_buffer
+            stats_buffer.flush()
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cleanup = ExitStack()
+        self.cleanup.enter_context(private_cache())
+
+    def teardown_test_environment(self, **kwargs):
+        self.cleanup.close()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+from ..cache import SQLiteCache, cache_from_url
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.location = os.path.join(directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        """Чтение, запись, add, incr и удаление"""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertTrue(self.cache.add('other', 2))
+        self.assertEqual(
+            self.cache.get_many(['key', 'other', 'missing']),
+            {'key': {'value': 1}, 'other': 2}
+        )
+        self.assertEqual(self.cache.incr('other', 3), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.delete_many(['key', 'other'])
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_expiration(self):
+        """Истекшее значение не читается, и на его место работает add"""
+        self.cache.set('key', 'value', 0.05)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_shared_between_instances(self):
+        """Разные экземпляры, как разные процессы, видят один кеш"""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_concurrent_incr(self):
+        """incr из нескольких потоков не теряет увеличений"""
+        self.cache.set('counter', 0)
+
+        def work():
+            for _ in range(50):
+                self.cache.incr('counter')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_cull(self):
+        """При переполнении удаляются записи с ближайшим сроком"""
+        cache = self.make_cache(MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        cache.CULL_EVERY = 1
+        for number in range(11):
+            cache.set(f'key{number}', number, 100 + number)
+        self.assertLessEqual(
+            len(cache.get_many([f'key{n}' for n in range(11)])), 10
+        )
+        self.assertEqual(cache.get('key10'), 10)
+
+    def test_cache_from_url(self):
+        """Настройки кеша строятся по адресу"""
+        self.assertEqual(cache_from_url('sqlite:///tmp/cache.sqlite3'), {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': '/tmp/cache.sqlite3',
+        })
+        self.assertEqual(
+            cache_from_url('memcached://a:11211,b:11211')['LOCATION'],
+            ['a:11211', 'b:11211']
+        )
+        self.assertEqual(
+            cache_from_url('redis://localhost:6379/0')['LOCATION'],
+            'redis://localhost:6379/0'
+        )
+
+
+class TestRunnerCacheTest(SimpleTestCase):
+    def test_tests_use_private_cache(self):
+        """Тесты не пишут в общий кеш сайта"""
+        self.assertIsInstance(caches['default'], LocMemCache)
+        self.assertNotEqual(
+            settings.CACHES['default']['BACKEND'],
+            cache_from_url(settings.CACHE_URL)['BACKEND']
+        )
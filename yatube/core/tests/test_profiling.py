@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from ..profiling import RequestProfile, report
+
+User = get_user_model()
+
+
+class ProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        report.clear()
+
+    def test_disabled_by_default(self):
+        """Без настройки заголовок не добавляется"""
+        response = Client().get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(PROFILING_ENABLED=True)
+    def test_server_timing(self):
+        """Заголовок Server-Timing содержит SQL, шаблоны и кеш"""
+        client = Client()
+        client.get(reverse('posts:index'))
+        response = client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'sql;dur=[\d.]+;desc="\d+ queries')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        self.assertIn('cache;desc="1 hits, 0 misses"', timing)
+
+    def test_duplicates_counted(self):
+        """Повторы одинаковых SQL-запросов считаются отдельно"""
+        profile = RequestProfile()
+        with connection.execute_wrapper(profile):
+            for _ in range(3):
+                list(Post.objects.filter(author=self.user))
+            list(Post.objects.filter(author=self.staff))
+        self.assertEqual(profile.query_count, 4)
+        self.assertEqual(profile.duplicates, 2)
+
+    @override_settings(PROFILING_ENABLED=True)
+    def test_report_rows(self):
+        """Замеры собираются в отчет по представлениям"""
+        client = Client()
+        client.get(reverse('posts:profile', args=(self.user.username,)))
+        client.get(reverse('posts:profile', args=(self.user.username,)))
+        row, = [
+            row for row in report.rows() if row['view'] == 'posts:profile'
+        ]
+        self.assertEqual(row['requests'], 2)
+        self.assertGreater(row['queries'], 0)
+
+    @override_settings(PROFILING_ENABLED=True)
+    def test_report_for_staff_only(self):
+        """Отчет доступен только сотрудникам"""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('profiling'))
+        self.assertEqual(response.status_code, 302)
+        client.force_login(self.staff)
+        client.get(reverse('posts:index'))
+        response = client.get(reverse('profiling'))
+        self.assertContains(response, 'posts:index')
+        client.post(reverse('profiling'))
+        self.assertNotIn(
+            'posts:index', [row['view'] for row in report.rows()]
+        )
@@ -0,0 +1,107 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts import users
+from posts.models import Post
+from ..routers import PIN_COOKIE, sync_replicas
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.client = Client()
+        self.client.force_login(self.author)
+        Post.objects.create(author=self.author, text='Старый пост')
+        sync_replicas()
+
+    def test_feeds_read_replica(self):
+        """Ленты читаются с реплики и видят записи после синхронизации"""
+        Post.objects.create(author=self.author, text='Новый пост')
+        for address in (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.author.username,)),
+        ):
+            with self.subTest(address=address):
+                response = self.client.get(address)
+                self.assertContains(response, 'Старый пост')
+                self.assertNotContains(response, 'Новый пост')
+        sync_replicas()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+
+    def test_other_views_read_primary(self):
+        """Представления без реплики читают default"""
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(reverse('posts:post_edit', args=(post.id,)))
+        self.assertEqual(response.status_code, 200)
+
+    def test_writer_pinned_to_primary(self):
+        """После изменения пользователь читает свои данные из default"""
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Мой пост'}
+        )
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertTrue(
+            Post.objects.using('default').filter(text='Мой пост').exists()
+        )
+        response = self.client.get(
+            reverse('posts:profile', args=(self.author.username,))
+        )
+        self.assertContains(response, 'Мой пост')
+        other = Client()
+        response = other.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Мой пост')
+
+    def test_follow_by_get_pinned_to_primary(self):
+        """Подписка по ссылке закрепляет чтение за default"""
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, text='Пост автора')
+        sync_replicas()
+        response = self.client.get(
+            reverse('posts:profile_follow', args=(other.username,))
+        )
+        self.assertIn(PIN_COOKIE, response.cookies)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Пост автора')
+
+    def test_recent_changes_not_cached(self):
+        """Страница с реплики сразу после изменения не получает ETag
+        и не оставляет в кеше устаревший фрагмент
+        """
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('ETag'))
+        Post.objects.create(author=self.author, text='Новый пост')
+        self.client.get(reverse('posts:index'))
+        sync_replicas()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+        with override_settings(REPLICA_STICKY_SECONDS=0):
+            response = self.client.get(reverse('posts:index'))
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_user_cache_reads_primary(self):
+        """Кеш имен не запоминает устаревшего пользователя с реплики"""
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Лев'
+        author.save()
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'Лев')
+        sync_replicas()
+        self.assertEqual(
+            users.by_id([self.author.pk])[self.author.pk].first_name, 'Лев'
+        )
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_disabled_without_replicas(self):
+        """Без реплик все запросы идут в default"""
+        Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
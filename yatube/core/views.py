@@ -1,4 +1,8 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.shortcuts import redirect, render
+
+from . import profiling
 
 
 def page_not_found(request, exception):
@@ -11,3 +15,16 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+@staff_member_required
+def profiling_report(request):
+    if request.method == 'POST':
+        profiling.report.clear()
+        return redirect('profiling')
+    context = {
+        'enabled': settings.PROFILING_ENABLED,
+        'rows': profiling.report.rows(),
+        'window': profiling.report.window,
+    }
+    return render(request, 'core/profiling.html', context)
@@ -0,0 +1,199 @@
+"""Потоковое API только для чтения в формате NDJSON.
+
+Каждая строка ответа — JSON-объект с полем type: post, comment, group
+или next. Строка next с курсором следующей страницы идет последней,
+если данные не закончились. Записи читаются итератором и отдаются
+по мере чтения, поэтому память не растет с размером страницы.
+"""
+import json
+
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from . import users
+from .models import Comment, Group, Post
+from .timeline import get_timeline_store
+from .utils import FORWARD, CursorPaginator, versioned
+
+CONTENT_TYPE = 'application/x-ndjson; charset=utf-8'
+
+
+class ApiError(Exception):
+    pass
+
+
+def _line(kind, data):
+    return json.dumps(
+        {'type': kind, 'data': data}, ensure_ascii=False
+    ) + '\n'
+
+
+def serialize_post(post):
+    author = users.by_id([post.author_id])[post.author_id]
+    return {
+        'id': post.id,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': author.username,
+        'author_name': author.full_name,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+    }
+
+
+def serialize_comment(comment):
+    author = users.by_id([comment.author_id])[comment.author_id]
+    return {
+        'id': comment.id,
+        'post': comment.post_id,
+        'author': author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def serialize_group(group):
+    return {
+        'slug': group.slug,
+        'title': group.title,
+        'description': group.description,
+    }
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', settings.POST_PER_PAGE))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    if not 1 <= limit <= settings.API_MAX_LIMIT:
+        raise ApiError(f'limit должен быть от 1 до {settings.API_MAX_LIMIT}')
+    return limit
+
+
+def _key(request, paginator):
+    cursor = request.GET.get('cursor')
+    if not cursor:
+        return None
+    decoded = paginator.decode_cursor(cursor)
+    if decoded is None or decoded[0] != FORWARD:
+        raise ApiError('Неверный курсор')
+    return decoded[1]
+
+
+def _page(request, paginator, kind, serialize):
+    """Строки одной страницы и курсор следующей."""
+    limit = _limit(request)
+    key = _key(request, paginator)
+    last = None
+    for index, obj in enumerate(paginator.iterate(key, limit + 1)):
+        if index == limit:
+            yield _line('next', {
+                'cursor': paginator.encode_cursor(last, FORWARD)
+            })
+            return
+        last = obj
+        yield _line(kind, serialize(obj))
+
+
+def _stream(lines, *head):
+    """Проверяет параметры до начала ответа, чтобы вернуть 400."""
+    try:
+        first = next(lines, None)
+    except ApiError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    body = [*head, first] if first is not None else list(head)
+    return StreamingHttpResponse(
+        _chain(body, lines), content_type=CONTENT_TYPE
+    )
+
+
+def _chain(body, lines):
+    yield from body
+    yield from lines
+
+
+def _feed(request, queryset):
+    return _stream(_page(
+        request, CursorPaginator(queryset, settings.POST_PER_PAGE),
+        'post', serialize_post
+    ))
+
+
+def _group_scopes(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True
+    ).first()
+    return None if group_id is None else (f'group:{group_id}',)
+
+
+def _profile_scopes(request, username):
+    author = users.by_username([username]).get(username)
+    return None if author is None else (f'profile:{author.id}',)
+
+
+@require_GET
+@versioned(lambda request: ('index',))
+def index(request):
+    return _feed(request, Post.objects.for_feed())
+
+
+@require_GET
+@versioned(lambda request: ())
+def groups(request):
+    return _stream(_page(
+        request,
+        CursorPaginator(Group.objects.all(), settings.API_MAX_LIMIT, ('id',)),
+        'group', serialize_group
+    ))
+
+
+@require_GET
+@versioned(_group_scopes)
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _feed(request, Post.objects.for_feed().filter(group=group))
+
+
+@require_GET
+@versioned(_profile_scopes)
+def profile(request, username):
+    author = users.by_username([username]).get(username)
+    if author is None:
+        raise Http404
+    return _feed(request, Post.objects.for_feed().filter(author=author.id))
+
+
+@require_GET
+@versioned(lambda request, post_id: (f'post:{post_id}',))
+def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
+    comments = CursorPaginator(
+        Comment.objects.filter(post=post),
+        settings.POST_PER_PAGE,
+        ('-created', '-id')
+    )
+    return _stream(
+        _page(request, comments, 'comment', serialize_comment),
+        # Число комментариев меняет версию post:<id>, но не версии лент,
+        # поэтому оно есть только на странице поста.
+        _line('post', {
+            **serialize_post(post), 'comment_count': post.comment_count
+        })
+    )
+
+
+@require_GET
+@versioned(lambda request: (
+    ('index', f'follow:{request.user.pk}')
+    if request.user.is_authenticated else None
+))
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Требуется вход'}, status=401)
+    store = get_timeline_store()
+    return _stream(_page(
+        request, store.paginator(request.user, settings.POST_PER_PAGE),
+        'post', serialize_post
+    ))
@@ -0,0 +1,293 @@
+"""Версионированный кеш фрагментов страниц.
+
+Ключ фрагмента включает версию его области (scope): 'index', 'groups',
+'group:<id>', 'profile:<id>', 'post:<id>', 'follow:<id>'. Сигналы
+моделей меняют версию затронутых областей, поэтому фрагменты живут
+часами, а устаревают сразу после изменения данных. Версия 'all'
+входит в каждый ключ и сбрасывает все фрагменты разом.
+
+Те же версии дают ETag и Last-Modified для условных GET-запросов:
+версия начинается со времени ее создания.
+
+get_or_compute защищает дорогие значения от одновременного пересчета
+(cache stampede): значение пересчитывает один запрос, держащий
+блокировку в кеше, а незадолго до истечения срока его заранее
+пересчитывает случайный запрос (XFetch).
+
+Карточка поста кешируется отдельно от страниц по версиям 'card:<id>'
+и 'user:<id>' автора, поэтому новый пост не сбрасывает карточки
+остальных постов ленты. cached_count хранит число записей области для
+номеров страниц до смены ее версии.
+
+Счетчики попаданий и промахов копятся в памяти процесса и переносятся
+в кеш раз в FRAGMENT_STATS_FLUSH_SECONDS: чтение из кеша не должно
+каждый раз писать в него.
+"""
+import atexit
+import hashlib
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+
+from core.profiling import record_cache
+
+VERSION_PREFIX = 'fragment-version:'
+LOCK_PREFIX = 'compute-lock:'
+STATS_PREFIX = 'fragment-stats:'
+COUNT_PREFIX = 'page-count:'
+GLOBAL_SCOPE = 'all'
+EVENTS = ('hit', 'miss', 'invalidation')
+
+
+def _kind(scope):
+    return scope.split(':', 1)[0]
+
+
+def _new_version():
+    # Уникальная версия вместо счетчика: после вытеснения ключа версии
+    # из кеша старые фрагменты не могут совпасть с новыми.
+    return f'{time.time():.3f}-{uuid.uuid4().hex}'
+
+
+def _version_time(version):
+    try:
+        return float(version.split('-', 1)[0])
+    except ValueError:
+        return time.time()
+
+
+def get_versions(*scopes):
+    keys = {VERSION_PREFIX + scope: scope for scope in scopes}
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def _set_new_versions(scopes):
+    cache.set_many(
+        {VERSION_PREFIX + scope: _new_version() for scope in scopes}, None
+    )
+
+
+def bump(*scopes):
+    """Сбрасывает фрагменты указанных областей.
+
+    Внутри транзакции версии меняются еще раз после фиксации: запрос,
+    прочитавший старые строки до нее, мог сохранить их под новой
+    версией.
+    """
+    _set_new_versions(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _set_new_versions(scopes))
+    for scope in scopes:
+        record(_kind(scope), 'invalidation')
+
+
+def fragment_key(name, scope, vary_on=()):
+    versions = get_versions(GLOBAL_SCOPE, scope)
+    return make_template_fragment_key(
+        name, [versions[GLOBAL_SCOPE], versions[scope], *vary_on]
+    )
+
+
+def card_keys(posts, variant):
+    """Ключи карточек постов по версиям поста и его автора.
+
+    Все версии читаются одним get_many.
+    """
+    versions = get_versions(GLOBAL_SCOPE, *{
+        scope for post in posts
+        for scope in (f'card:{post.pk}', f'user:{post.author_id}')
+    })
+    return [
+        make_template_fragment_key('post_card', [
+            versions[GLOBAL_SCOPE],
+            versions[f'card:{post.pk}'],
+            versions[f'user:{post.author_id}'],
+            variant,
+        ])
+        for post in posts
+    ]
+
+
+def etag(*scopes, vary_on=()):
+    """Хеш версий областей: меняется при любом их изменении."""
+    versions = get_versions(GLOBAL_SCOPE, *scopes)
+    parts = [versions[scope] for scope in sorted(versions)]
+    return hashlib.md5(
+        ':'.join([*parts, *map(str, vary_on)]).encode()
+    ).hexdigest()
+
+
+def last_modified(*scopes):
+    """Время последнего изменения областей."""
+    versions = get_versions(GLOBAL_SCOPE, *scopes)
+    return datetime.fromtimestamp(
+        max(map(_version_time, versions.values())), timezone.utc
+    )
+
+
+def changed_recently(*scopes):
+    """Области менялись в пределах REPLICA_STICKY_SECONDS: реплика
+    может еще не видеть этих изменений.
+    """
+    versions = get_versions(GLOBAL_SCOPE, *scopes)
+    since = time.time() - settings.REPLICA_STICKY_SECONDS
+    return any(_version_time(version) > since for version in versions.values())
+
+
+class StatsBuffer:
+    """Счетчики процесса, которые периодически прибавляются к общим."""
+
+    def __init__(self):
+        self.pending = Counter()
+        self.lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+
+    def add(self, key, count):
+        with self.lock:
+            self.pending[key] += count
+            due = (
+                time.monotonic() - self.flushed_at
+                >= settings.FRAGMENT_STATS_FLUSH_SECONDS
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending = dict(self.pending)
+            self.pending.clear()
+            self.flushed_at = time.monotonic()
+        for key, count in pending.items():
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                if not cache.add(key, count, None):
+                    cache.incr(key, count)
+
+
+stats_buffer = StatsBuffer()
+atexit.register(stats_buffer.flush)
+
+
+def record(kind, event, count=1):
+    if not count:
+        return
+    record_cache(event, count)
+    stats_buffer.add(f'{STATS_PREFIX}{kind}:{event}', count)
+
+
+def stats():
+    """Попадания, промахи и сбросы по каждому виду фрагментов."""
+    stats_buffer.flush()
+    keys = [
+        f'{STATS_PREFIX}{kind}:{event}'
+        for kind in settings.FRAGMENT_CACHE_KINDS for event in EVENTS
+    ]
+    values = cache.get_many(keys)
+    return {
+        kind: {
+            event: values.get(f'{STATS_PREFIX}{kind}:{event}', 0)
+            for event in EVENTS
+        }
+        for kind in settings.FRAGMENT_CACHE_KINDS
+    }
+
+
+def _stored(key):
+    """(значение, время пересчета, срок) или None."""
+    entry = cache.get(key)
+    if isinstance(entry, tuple) and len(entry) == 3:
+        return entry
+    return None
+
+
+def _expires_early(entry):
+    _, delta, expires = entry
+    if expires is None:
+        return False
+    beta = settings.CACHE_EARLY_RECOMPUTE_BETA
+    return time.time() - delta * beta * math.log(random.random()) >= expires
+
+
+def _wait(key):
+    deadline = time.monotonic() + settings.CACHE_COMPUTE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = _stored(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_or_compute(key, compute, timeout, kind=None,
+                   cacheable=lambda value: True):
+    """Значение из кеша или результат compute().
+
+    Промах или ранний пересчет берет блокировку: остальные запросы
+    тем временем получают прежнее значение или ждут нового не дольше
+    CACHE_COMPUTE_WAIT. Значение, для которого cacheable вернул False,
+    не сохраняется.
+    """
+    entry = _stored(key)
+    if entry is not None and not _expires_early(entry):
+        if kind:
+            record(kind, 'hit')
+        return entry[0]
+    lock = LOCK_PREFIX + key
+    locked = cache.add(lock, 1, settings.CACHE_COMPUTE_WAIT)
+    if not locked:
+        if entry is None:
+            entry = _wait(key)
+        if entry is not None:
+            if kind:
+                record(kind, 'hit')
+            return entry[0]
+    if kind:
+        record(kind, 'miss')
+    try:
+        started = time.monotonic()
+        value = compute()
+        if cacheable(value):
+            cache.set(key, (
+                value,
+                time.monotonic() - started,
+                None if timeout is None else time.time() + timeout
+            ), timeout)
+    finally:
+        if locked:
+            cache.delete(lock)
+    return value
+
+
+def cached_count(scope, compute, store=True):
+    """Число записей области, посчитанное compute().
+
+    Значение действует до смены версии области и еще
+    PAGINATOR_COUNT_MAX_AGE секунд после нее.
+    """
+    key = COUNT_PREFIX + scope
+    version = get_versions(scope)[scope]
+    entry = cache.get(key)
+    if entry is not None:
+        count, counted_version, counted_at = entry
+        if (counted_version == version or time.time() - counted_at
+                < settings.PAGINATOR_COUNT_MAX_AGE):
+            return count
+    count = compute()
+    if store:
+        cache.set(key, (count, version, time.time()), None)
+    return count
@@ -0,0 +1,128 @@
+"""Групповая запись комментариев.
+
+При COMMENT_WRITE_BEHIND add_comment проверяет форму в запросе и кладет
+комментарий в буфер процесса, а затем ждет, пока буфер сохранится.
+Сохраняет его первый запрос, дошедший до записи, одним bulk_create
+вместе с комментариями соседних запросов; остальные запросы ждут
+блокировку записи и копят следующую пачку. Поэтому всплеск комментариев
+к одному посту занимает блокировку записи SQLite один раз на пачку,
+а комментарий уже сохранен к редиректу на страницу поста, какой бы
+процесс ее ни отдал. bulk_create не отправляет сигналы: счетчики,
+поисковый индекс и кеш страниц обновляются для всей пачки сразу.
+"""
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from . import cache, counters
+from .models import Comment, Post
+from .search import get_search_backend
+
+logger = logging.getLogger(__name__)
+
+INSERT_BATCH_SIZE = 200
+
+
+def write(comments):
+    """Сохраняет пачку и делает работу сигналов сразу для всей пачки."""
+    post_ids = set(Post.objects.filter(
+        pk__in={comment.post_id for comment in comments}
+    ).values_list('pk', flat=True))
+    # Пост могли удалить, пока комментарий ждал в буфере.
+    comments = [
+        comment for comment in comments if comment.post_id in post_ids
+    ]
+    per_post = Counter(comment.post_id for comment in comments)
+    texts = defaultdict(list)
+    for comment in comments:
+        texts[comment.post_id].append(comment.text)
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments, batch_size=INSERT_BATCH_SIZE)
+        backend = get_search_backend()
+        for post_id, count in per_post.items():
+            counters.bump_comments(post_id, count)
+            backend.add_comments(post_id, texts[post_id])
+    if per_post:
+        cache.bump(*(f'post:{post_id}' for post_id in per_post))
+    return len(comments)
+
+
+class CommentWriter:
+    """Буфер комментариев, который сохраняют сами запросы пачками."""
+
+    def __init__(self):
+        self.buffer = []
+        self.pending = Counter()
+        self.condition = threading.Condition()
+        # Пишет один поток, остальные копят комментарии в буфере.
+        self.write_lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+
+    def add(self, comment):
+        key = (comment.author_id, comment.post_id)
+        with self.condition:
+            self.buffer.append(comment)
+            self.pending[key] += 1
+
+    def _take(self):
+        batch, self.buffer = self.buffer, []
+        return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        # Ошибка пачки не должна ронять запросы, которые ее ждали.
+        try:
+            written = write(batch)
+        except Exception:
+            logger.exception('Не удалось сохранить %d комментариев',
+                             len(batch))
+            written = None
+        with self.condition:
+            if written is None:
+                self.failed += len(batch)
+            else:
+                self.written += written
+                self.batches += 1
+            for comment in batch:
+                key = (comment.author_id, comment.post_id)
+                self.pending[key] -= 1
+                if not self.pending[key]:
+                    del self.pending[key]
+
+    def flush(self):
+        """Сохраняет буфер в текущем потоке."""
+        with self.write_lock:
+            with self.condition:
+                batch = self._take()
+            self._write(batch)
+
+    def wait(self, user_id, post_id):
+        """Дожидается сохранения комментариев пользователя к посту."""
+        key = (user_id, post_id)
+        with self.condition:
+            if not self.pending[key]:
+                return
+        with self.write_lock:
+            with self.condition:
+                # Пока поток ждал, пачку с комментарием сохранил другой.
+                if not self.pending[key]:
+                    return
+                batch = self._take()
+            self._write(batch)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'buffered': len(self.buffer),
+                'written': self.written,
+                'batches': self.batches,
+                'failed': self.failed,
+            }
+
+
+writer = CommentWriter()
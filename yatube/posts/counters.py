@@ -0,0 +1,172 @@
+"""Денормализованные счетчики постов, комментариев, подписок и групп.
+
+Счетчики меняются атомарным UPDATE ... SET x = x + 1 из сигналов
+моделей, поэтому страницам не нужны агрегирующие запросы. Расхождения
+исправляет команда recount_counters.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import (Case, Count, F, Max, OuterRef, Subquery, Value,
+                              When)
+from django.db.models.functions import Coalesce
+
+from .models import (Comment, Follow, Group, GroupAuthorStats, GroupStats,
+                     Post, UserStats)
+
+User = get_user_model()
+
+TOP_AUTHORS = 3
+
+
+def bump_user(user_id, **deltas):
+    """Изменяет счетчики пользователя на указанные величины.
+
+    Строка для уменьшения не создается: при каскадном удалении
+    пользователя она уже удалена вместе с ним.
+    """
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    updated = UserStats.objects.filter(pk=user_id).update(**changes)
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        UserStats.objects.get_or_create(pk=user_id)
+        UserStats.objects.filter(pk=user_id).update(**changes)
+
+
+def bump_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F('comment_count') + delta
+    )
+
+
+def _refresh_top_authors(group_id):
+    top = GroupAuthorStats.objects.filter(
+        group_id=group_id, post_count__gt=0
+    ).order_by('-post_count', 'author_id').values_list(
+        'author_id', 'post_count'
+    )[:TOP_AUTHORS]
+    GroupStats.objects.filter(pk=group_id).update(
+        top_authors=','.join(f'{author}:{count}' for author, count in top)
+    )
+
+
+def bump_group(group_id, author_id, delta, pub_date=None):
+    """Меняет сводку группы при появлении или уходе поста."""
+    changes = {'post_count': F('post_count') + delta}
+    if delta > 0:
+        changes['last_post_at'] = Case(
+            When(last_post_at__gte=pub_date, then=F('last_post_at')),
+            default=Value(pub_date)
+        )
+    else:
+        # Ушедший пост мог быть последним: дата берется по индексу.
+        changes['last_post_at'] = Subquery(
+            Post.objects.filter(group_id=group_id).order_by(
+                '-pub_date'
+            ).values('pub_date')[:1]
+        )
+    if not GroupStats.objects.filter(pk=group_id).update(**changes):
+        if delta < 0:
+            return
+        GroupStats.objects.get_or_create(pk=group_id)
+        GroupStats.objects.filter(pk=group_id).update(**changes)
+    authors = GroupAuthorStats.objects.filter(
+        group_id=group_id, author_id=author_id
+    )
+    if not authors.update(post_count=F('post_count') + delta) and delta > 0:
+        GroupAuthorStats.objects.get_or_create(
+            group_id=group_id, author_id=author_id,
+            defaults={'post_count': delta}
+        )
+    authors.filter(post_count__lte=0).delete()
+    _refresh_top_authors(group_id)
+
+
+def get_user_stats(user):
+    """Счетчики пользователя без запроса, если они выбраны
+    через select_related('stats').
+    """
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return UserStats(user=user)
+
+
+def _count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def refresh_comment_counts(post_ids):
+    """Пересчитывает счетчики комментариев постов одним UPDATE."""
+    Post.objects.filter(pk__in=post_ids).update(
+        comment_count=_count(Comment, 'post')
+    )
+
+
+def recount():
+    """Пересчитывает счетчики по данным и возвращает число
+    исправленных строк по каждой таблице.
+    """
+    fixed = {'users': 0, 'posts': 0}
+    users = User.objects.annotate(
+        real_posts=_count(Post, 'author'),
+        real_followers=_count(Follow, 'author'),
+        real_following=_count(Follow, 'user'),
+    ).select_related('stats')
+    for user in users.iterator():
+        stats = get_user_stats(user)
+        real = (user.real_posts, user.real_followers, user.real_following)
+        if stats.pk is not None and real == (
+            stats.post_count, stats.follower_count, stats.following_count
+        ):
+            continue
+        UserStats.objects.update_or_create(pk=user.pk, defaults={
+            'post_count': user.real_posts,
+            'follower_count': user.real_followers,
+            'following_count': user.real_following,
+        })
+        fixed['users'] += 1
+    posts = Post.objects.annotate(
+        real_comments=_count(Comment, 'post')
+    ).exclude(comment_count=F('real_comments'))
+    for post_id, real_comments in posts.values_list(
+        'pk', 'real_comments'
+    ).iterator():
+        Post.objects.filter(pk=post_id).update(comment_count=real_comments)
+        fixed['posts'] += 1
+    fixed['groups'] = recount_groups()
+    return fixed
+
+
+def recount_groups():
+    """Заново собирает сводки всех групп и возвращает их число."""
+    GroupAuthorStats.objects.all().delete()
+    GroupAuthorStats.objects.bulk_create(
+        (
+            GroupAuthorStats(
+                group_id=row['group'], author_id=row['author'],
+                post_count=row['total']
+            )
+            for row in Post.objects.exclude(group=None).order_by().values(
+                'group', 'author'
+            ).annotate(total=Count('pk')).iterator()
+        ),
+        batch_size=200
+    )
+    totals = {
+        row['group']: row
+        for row in Post.objects.exclude(group=None).order_by().values(
+            'group'
+        ).annotate(total=Count('pk'), last=Max('pub_date'))
+    }
+    count = 0
+    for group_id in Group.objects.values_list('pk', flat=True).iterator():
+        row = totals.get(group_id, {'total': 0, 'last': None})
+        GroupStats.objects.update_or_create(pk=group_id, defaults={
+            'post_count': row['total'],
+            'last_post_at': row['last'],
+        })
+        _refresh_top_authors(group_id)
+        count += 1
+    return count
@@ -0,0 +1,113 @@
+"""Запись подписок без лишних запросов.
+
+Представления находят id автора через posts.users без запроса к базе.
+Подписка пишется одним INSERT ... ON CONFLICT DO NOTHING RETURNING:
+повторный или одновременный клик не нарушает ограничение unique
+follow, а RETURNING сообщает, какие строки вставлены. Отписка — один
+DELETE ... RETURNING. Сырой SQL не отправляет сигналы, поэтому они
+отправляются только для действительно вставленных и удаленных строк:
+счетчики, ленты и кеш страниц обновляют прежние обработчики.
+SQLite старше 3.35 не знает RETURNING: там каждая строка пишется
+отдельным запросом, и вставку или удаление показывает rowcount.
+"""
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+
+from .models import Follow
+
+
+def _table():
+    return connection.ops.quote_name(Follow._meta.db_table)
+
+
+def returning_supported():
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return True
+
+
+def _insert_returning(cursor, user_id, author_ids):
+    values = ', '.join(['(%s, %s)'] * len(author_ids))
+    params = [value for author_id in author_ids
+              for value in (user_id, author_id)]
+    cursor.execute(
+        f'INSERT INTO {_table()} (user_id, author_id) '
+        f'VALUES {values} ON CONFLICT DO NOTHING '
+        f'RETURNING id, author_id',
+        params
+    )
+    return cursor.fetchall()
+
+
+def _insert_each(cursor, user_id, author_ids):
+    rows = []
+    for author_id in author_ids:
+        cursor.execute(
+            f'INSERT OR IGNORE INTO {_table()} (user_id, author_id) '
+            'VALUES (%s, %s)',
+            [user_id, author_id]
+        )
+        if cursor.rowcount:
+            rows.append((cursor.lastrowid, author_id))
+    return rows
+
+
+def _delete_returning(cursor, user_id, author_ids):
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    cursor.execute(
+        f'DELETE FROM {_table()} WHERE user_id = %s '
+        f'AND author_id IN ({placeholders}) RETURNING id, author_id',
+        [user_id, *author_ids]
+    )
+    return cursor.fetchall()
+
+
+def _delete_each(cursor, user_id, author_ids):
+    rows = []
+    for pk, author_id in Follow.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).values_list('id', 'author_id'):
+        cursor.execute(f'DELETE FROM {_table()} WHERE id = %s', [pk])
+        if cursor.rowcount:
+            rows.append((pk, author_id))
+    return rows
+
+
+def follow(user_id, author_ids):
+    """Подписывает на авторов и возвращает id новых подписок."""
+    author_ids = [
+        author_id for author_id in dict.fromkeys(author_ids)
+        if author_id != user_id
+    ]
+    if not author_ids:
+        return []
+    insert = _insert_returning if returning_supported() else _insert_each
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            rows = insert(cursor, user_id, author_ids)
+        for pk, author_id in rows:
+            post_save.send(
+                sender=Follow,
+                instance=Follow(pk=pk, user_id=user_id, author_id=author_id),
+                created=True, update_fields=None, raw=False,
+                using=connection.alias
+            )
+    return [author_id for _, author_id in rows]
+
+
+def unfollow(user_id, author_ids):
+    """Отписывает от авторов и возвращает id снятых подписок."""
+    author_ids = list(dict.fromkeys(author_ids))
+    if not author_ids:
+        return []
+    delete = _delete_returning if returning_supported() else _delete_each
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            rows = delete(cursor, user_id, author_ids)
+        for pk, author_id in rows:
+            post_delete.send(
+                sender=Follow,
+                instance=Follow(pk=pk, user_id=user_id, author_id=author_id),
+                using=connection.alias
+            )
+    return [author_id for _, author_id in rows]
@@ -1,5 +1,6 @@
 from django import forms
 
+from . import images
 from .models import Comment, Post
 
 
@@ -13,6 +14,12 @@ class PostForm(forms.ModelForm):
             'group': 'Группа, к которой будет относиться пост',
         }
 
+    def save(self, commit=True):
+        # Сведения о картинке считаются один раз, при ее загрузке.
+        if 'image' in self.changed_data:
+            images.fill(self.instance)
+        return super().save(commit)
+
 
 class CommentForm(forms.ModelForm):
 
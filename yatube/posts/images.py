@@ -0,0 +1,63 @@
+"""Сведения о картинках постов, вычисляемые один раз при загрузке.
+
+PostForm сохраняет в посте размеры картинки, размер файла, хеш
+содержимого и крошечную размытую копию (LQIP) в виде data URI. Шаблоны
+выводят фон-заглушку из этих полей и не открывают файл картинки при
+рендере. Для старых постов поля заполняет команда backfill_images.
+"""
+import hashlib
+from base64 import b64encode
+from io import BytesIO
+
+from PIL import Image
+
+FIELDS = (
+    'image_width', 'image_height', 'image_size', 'image_hash',
+    'image_placeholder',
+)
+PLACEHOLDER_SIZE = (16, 16)
+PLACEHOLDER_QUALITY = 40
+
+
+def placeholder(picture):
+    """Data URI уменьшенной до нескольких пикселей копии картинки."""
+    picture = picture.convert('RGB')
+    picture.thumbnail(PLACEHOLDER_SIZE)
+    buffer = BytesIO()
+    picture.save(buffer, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    return 'data:image/jpeg;base64,' + b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+def describe(file):
+    """Значения полей FIELDS для открытого файла картинки."""
+    digest = hashlib.sha256()
+    size = 0
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    with Image.open(file) as picture:
+        width, height = picture.size
+        lqip = placeholder(picture)
+    file.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_size': size,
+        'image_hash': digest.hexdigest(),
+        'image_placeholder': lqip,
+    }
+
+
+def fill(post):
+    """Заполняет сведения о новой картинке поста или очищает их."""
+    if post.image:
+        values = describe(post.image.file)
+    else:
+        values = dict.fromkeys(FIELDS)
+        values.update(image_hash='', image_placeholder='')
+    for field, value in values.items():
+        setattr(post, field, value)
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import cache, images, thumbnails
+from posts.models import ImageVariant, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет размеры, размер файла, хеш и заглушку картинок '
+        'постов, загруженных до появления этих полей или импортом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать сведения и у заполненных постов'
+        )
+        parser.add_argument(
+            '--variants', action='store_true',
+            help='Сразу создать варианты для srcset у постов без них'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(
+                Q(image_size__isnull=True) | Q(image_placeholder='')
+            )
+        storage = Post._meta.get_field('image').storage
+        filled = failed = 0
+        for pk, name in posts.values_list('pk', 'image').iterator():
+            try:
+                with storage.open(name) as file:
+                    values = images.describe(file)
+            except OSError as error:
+                failed += 1
+                self.stderr.write(f'Пост {pk}, {name}: {error}')
+                continue
+            Post.objects.filter(pk=pk).update(**values)
+            filled += 1
+        if filled:
+            # Размеры и заглушки есть в карточках всех лент.
+            cache.bump(cache.GLOBAL_SCOPE)
+        self.stdout.write(self.style.SUCCESS(
+            f'Заполнено картинок: {filled}, не удалось прочитать: {failed}'
+        ))
+        if options['variants']:
+            self.generate_variants()
+
+    def generate_variants(self):
+        # Картинки с отметкой о сбое обрабатываются снова.
+        ready = ImageVariant.objects.exclude(
+            format=thumbnails.FAILED
+        ).values('post')
+        posts = Post.objects.exclude(image='').exclude(pk__in=ready)
+        generated = 0
+        for pk, name in posts.values_list('pk', 'image').iterator():
+            try:
+                thumbnails.generate(pk, name)
+            except OSError as error:
+                self.stderr.write(f'Пост {pk}, {name}: {error}')
+                continue
+            generated += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Созданы варианты картинок постов: {generated}'
+        ))
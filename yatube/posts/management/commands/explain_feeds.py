@@ -0,0 +1,187 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+from posts.utils import CursorPaginator
+
+User = get_user_model()
+PER_PAGE = 10
+BATCH_SIZE = 200
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает план и время запросов каждой ленты '
+        'без составных индексов и с ними'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Создать указанное число постов на время замеров'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз выполнять каждый запрос'
+        )
+        parser.add_argument(
+            '--depth', type=float, default=0.5,
+            help='Положение глубокой страницы в ленте, от 0 до 1'
+        )
+
+    def handle(self, *args, **options):
+        # Строки --seed создаются без сигналов, то есть без счетчиков,
+        # сводок и поискового индекса, поэтому после замеров они
+        # откатываются вместе со всей транзакцией.
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(options['seed'])
+            self.explain(options)
+            transaction.set_rollback(True)
+
+    def explain(self, options):
+        queries = self.feed_queries(options['depth'])
+        if not queries:
+            self.stderr.write('Нет данных: запустите команду с --seed')
+            return
+        with transaction.atomic():
+            self.drop_indexes()
+            self.report('Без индексов', queries, options['repeat'])
+            transaction.set_rollback(True)
+        self.report('С индексами', queries, options['repeat'])
+
+    def seed(self, count):
+        prefix = f'explain{random.randrange(10 ** 6)}'
+        users_count = max(count // 100, 10)
+        User.objects.bulk_create(
+            (User(username=f'{prefix}-{i}') for i in range(users_count)),
+            batch_size=BATCH_SIZE
+        )
+        Group.objects.bulk_create(
+            Group(slug=f'{prefix}-{i}', title=f'Группа {i}', description='')
+            for i in range(10)
+        )
+        user_ids = list(User.objects.filter(
+            username__startswith=prefix
+        ).values_list('id', flat=True))
+        group_ids = list(Group.objects.filter(
+            slug__startswith=prefix
+        ).values_list('id', flat=True))
+        for start in range(0, count, BATCH_SIZE):
+            Post.objects.bulk_create(
+                Post(
+                    text=f'Тестовый пост {start + i}',
+                    author_id=random.choice(user_ids),
+                    group_id=random.choice(group_ids + [None]),
+                )
+                for i in range(min(BATCH_SIZE, count - start))
+            )
+        reader_id = user_ids[0]
+        Follow.objects.bulk_create(
+            Follow(user_id=reader_id, author_id=author_id)
+            for author_id in user_ids[1:11]
+        )
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=reader_id, post_id=post_id,
+                    author_id=author_id, pub_date=pub_date
+                )
+                for post_id, author_id, pub_date in Post.objects.filter(
+                    author_id__in=user_ids[1:11]
+                ).values_list('id', 'author_id', 'pub_date').iterator()
+            ),
+            batch_size=BATCH_SIZE
+        )
+        post_ids = list(Post.objects.filter(
+            author_id__in=user_ids
+        ).values_list('id', flat=True)[:100])
+        Comment.objects.bulk_create(
+            (
+                Comment(
+                    post_id=post_ids[0],
+                    author_id=random.choice(user_ids),
+                    text=f'Комментарий {i}'
+                )
+                for i in range(count // 10)
+            ),
+            batch_size=BATCH_SIZE
+        )
+        self.stdout.write(f'Создано постов: {count}')
+
+    def feed_queries(self, depth):
+        """Запросы первой и глубокой страницы каждой ленты."""
+        author_id = Post.objects.values_list('author_id', flat=True).first()
+        if author_id is None:
+            return {}
+        group_id = Post.objects.exclude(group=None).values_list(
+            'group_id', flat=True
+        ).first()
+        commented_id = Comment.objects.values_list(
+            'post_id', flat=True
+        ).first()
+        follow = Follow.objects.first()
+        feeds = {
+            'index': (Post.objects.for_feed(), ('-pub_date', '-id')),
+            'group_posts': (
+                Post.objects.for_feed().filter(group_id=group_id),
+                ('-pub_date', '-id')
+            ),
+            'profile': (
+                Post.objects.for_feed().filter(author_id=author_id),
+                ('-pub_date', '-id')
+            ),
+            'post_detail': (
+                Comment.objects.select_related('author').filter(
+                    post_id=commented_id
+                ),
+                ('-created', '-id')
+            ),
+        }
+        if follow is not None:
+            feeds['follow_index'] = (
+                TimelineEntry.objects.select_related(
+                    'post__author', 'post__group'
+                ).filter(user_id=follow.user_id),
+                ('-pub_date', '-post_id')
+            )
+        queries = {}
+        for name, (queryset, ordering) in feeds.items():
+            paginator = CursorPaginator(queryset, PER_PAGE, ordering)
+            total = paginator.object_list.count()
+            queries[f'{name} (первая)'] = paginator.page_queryset()[
+                :PER_PAGE + 1
+            ]
+            if not total:
+                continue
+            deep = paginator.object_list[int((total - 1) * depth)]
+            queries[f'{name} (глубокая)'] = paginator.page_queryset(
+                paginator._get_key(deep)
+            )[:PER_PAGE + 1]
+        return queries
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for model in (Post, Comment):
+                for index in model._meta.indexes:
+                    cursor.execute(
+                        f'DROP INDEX {connection.ops.quote_name(index.name)}'
+                    )
+
+    def report(self, title, queries, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: {statistics.median(timings):.2f} мс'
+            ))
+            self.stdout.write(queryset.explain())
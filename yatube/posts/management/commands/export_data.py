@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии и подписки в каталог'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог для файлов')
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, default='ndjson',
+            help='Формат файлов'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = transfer.export(options['directory'], options['format'])
+        for table, count in counts.items():
+            self.stdout.write(f'{table}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгрузка заняла {time.perf_counter() - started:.1f} с'
+        ))
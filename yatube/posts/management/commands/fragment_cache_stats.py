@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.cache import EVENTS, stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания, промахи и сбросы кеша фрагментов'
+
+    def handle(self, *args, **options):
+        self.stdout.write('{:<10}'.format('fragment') + ''.join(
+            f'{event:>14}' for event in EVENTS
+        ))
+        for kind, events in stats().items():
+            self.stdout.write(f'{kind:<10}' + ''.join(
+                f'{events[event]:>14}' for event in EVENTS
+            ))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает группы, посты, комментарии и подписки из каталога, '
+        'выгруженного export_data'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог с файлами')
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, default='ndjson',
+            help='Формат файлов'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE,
+            help='Строк в одной транзакции'
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить прерванный импорт с контрольной точки'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = transfer.Importer(
+            options['directory'], options['format'],
+            batch_size=options['batch_size'], resume=options['resume']
+        ).run()
+        for table, count in counts.items():
+            self.stdout.write(f'{table}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загрузка заняла {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики постов, комментариев и подписок '
+        'и сводки групп'
+    )
+
+    def handle(self, *args, **options):
+        fixed = recount()
+        self.stdout.write(self.style.SUCCESS(
+            'Исправлено счетчиков пользователей: {users}, '
+            'постов: {posts}; пересобрано сводок групп: {groups}'.format(
+                **fixed
+            )
+        ))
@@ -0,0 +1,59 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:22
+
+from django.db import OperationalError, migrations, models
+import django.db.models.deletion
+
+
+def create_search_table(apps, schema_editor):
+    # Без FTS5 поиск работает по SearchTerm, который заполняет
+    # команда rebuild_search_index.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                'CREATE VIRTUAL TABLE posts_search USING fts5('
+                "text, comments, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            return
+        cursor.execute(
+            'INSERT INTO posts_search (rowid, text, comments) '
+            'SELECT post.id, post.text, COALESCE(('
+            "SELECT group_concat(comment.text, ' ') FROM posts_comment comment "
+            "WHERE comment.post_id = post.id), '') FROM posts_post post"
+        )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Слово')),
+                ('weight', models.FloatField(verbose_name='Вес')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Слово поиска',
+                'verbose_name_plural': 'Обратный индекс поиска',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term', 'post'], name='search_term_post'),
+        ),
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max
+
+TOP_AUTHORS = 3
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    GroupAuthorStats = apps.get_model('posts', 'GroupAuthorStats')
+    for group_id in Group.objects.values_list('id', flat=True).iterator():
+        posts = Post.objects.filter(group_id=group_id)
+        authors = list(posts.order_by().values('author_id').annotate(
+            total=Count('id')
+        ).order_by('-total', 'author_id'))
+        GroupAuthorStats.objects.bulk_create(
+            GroupAuthorStats(
+                group_id=group_id,
+                author_id=row['author_id'],
+                post_count=row['total']
+            )
+            for row in authors
+        )
+        GroupStats.objects.create(
+            group_id=group_id,
+            post_count=posts.count(),
+            last_post_at=posts.aggregate(last=Max('pub_date'))['last'],
+            top_authors=','.join(
+                f"{row['author_id']}:{row['total']}"
+                for row in authors[:TOP_AUTHORS]
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupAuthorStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_count', models.IntegerField(default=0, verbose_name='Постов')),
+            ],
+            options={
+                'verbose_name': 'Активность автора в группе',
+                'verbose_name_plural': 'Активность авторов в группах',
+            },
+        ),
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group', verbose_name='Группа')),
+                ('post_count', models.IntegerField(default=0, verbose_name='Постов')),
+                ('last_post_at', models.DateTimeField(null=True, verbose_name='Последний пост')),
+                ('top_authors', models.CharField(blank=True, max_length=200, verbose_name='Самые активные авторы')),
+            ],
+            options={
+                'verbose_name': 'Сводка группы',
+                'verbose_name_plural': 'Сводки групп',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='groupstats',
+            index=models.Index(fields=['-post_count', 'group'], name='group_stats_post_count'),
+        ),
+        migrations.AddField(
+            model_name='groupauthorstats',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AddField(
+            model_name='groupauthorstats',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Group', verbose_name='Группа'),
+        ),
+        migrations.AddIndex(
+            model_name='groupauthorstats',
+            index=models.Index(fields=['group', '-post_count'], name='group_author_post_count'),
+        ),
+        migrations.AddConstraint(
+            model_name='groupauthorstats',
+            constraint=models.UniqueConstraint(fields=('group', 'author'), name='unique group author'),
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
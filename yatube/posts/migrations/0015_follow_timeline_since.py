@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='follow',
+            name='timeline_since',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Лента заполнена с'),
+        ),
+    ]
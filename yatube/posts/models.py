@@ -13,6 +13,23 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    # Поля, которые выводят карточки постов в лентах.
+    FEED_FIELDS = (
+        'text', 'pub_date', 'image', 'image_width', 'image_height',
+        'image_placeholder', 'comment_count', 'author',
+        'group__slug', 'group__title',
+    )
+
+    def for_feed(self):
+        """Посты для лент: группа одним запросом, без лишних колонок.
+        Имена авторов берутся из posts.users.
+        """
+        return self.select_related('group').only(
+            *self.FEED_FIELDS
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         'Текст поста',
@@ -41,14 +58,89 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    # Сведения о картинке заполняет posts.images при загрузке. Без
+    # width_field Django не открывает файл при создании объекта.
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        blank=True, null=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        blank=True, null=True,
+        editable=False
+    )
+    image_size = models.PositiveIntegerField(
+        'Размер файла картинки',
+        blank=True, null=True,
+        editable=False
+    )
+    image_hash = models.CharField(
+        'SHA-256 картинки',
+        max_length=64,
+        blank=True,
+        editable=False
+    )
+    image_placeholder = models.TextField(
+        'Заглушка картинки',
+        blank=True,
+        editable=False
+    )
+    comment_count = models.IntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
+class ImageVariant(models.Model):
+    """Готовый вариант картинки поста одной ширины в одном формате."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_variants',
+        verbose_name='Пост'
+    )
+    source = models.CharField('Исходная картинка', max_length=100)
+    format = models.CharField('Формат', max_length=10)
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+    name = models.CharField('Файл', max_length=255)
+
+    class Meta:
+        ordering = ['post', 'format', 'width']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'source', 'format', 'width'],
+                name='unique image variant'
+            )
+        ]
+        verbose_name = 'Вариант картинки'
+        verbose_name_plural = 'Варианты картинок'
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -72,7 +164,13 @@ class Comment(models.Model):
     )
 
     class Meta:
-        ordering = ['-created']
+        ordering = ['-created', '-id']
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created'
+            ),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -93,6 +191,11 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='Автор',
     )
+    # Посты автора не позже этой даты не разложены в ленту подписчика
+    # и читаются при прокрутке; None — разложены все.
+    timeline_since = models.DateTimeField(
+        'Лента заполнена с', null=True, blank=True
+    )
 
     class Meta:
         constraints = [
@@ -101,3 +204,160 @@ class Follow(models.Model):
                 name='unique follow'
             )
         ]
+
+
+class UserStats(models.Model):
+    """Счетчики пользователя, которые поддерживаются сигналами."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    post_count = models.IntegerField('Постов', default=0)
+    follower_count = models.IntegerField('Подписчиков', default=0)
+    following_count = models.IntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class GroupStats(models.Model):
+    """Сводка группы для каталога, которая поддерживается сигналами."""
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Группа'
+    )
+    post_count = models.IntegerField('Постов', default=0)
+    last_post_at = models.DateTimeField('Последний пост', null=True)
+    # Самые активные авторы в виде «id:постов,...», чтобы каталог
+    # не собирал их из GroupAuthorStats для каждой группы.
+    top_authors = models.CharField(
+        'Самые активные авторы', max_length=200, blank=True
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-post_count', 'group'],
+                name='group_stats_post_count'
+            ),
+        ]
+        verbose_name = 'Сводка группы'
+        verbose_name_plural = 'Сводки групп'
+
+    def __str__(self):
+        return str(self.group)
+
+    def top_author_counts(self):
+        """Пары (id автора, число постов) по убыванию активности."""
+        return [
+            tuple(map(int, pair.split(':')))
+            for pair in self.top_authors.split(',') if pair
+        ]
+
+
+class GroupAuthorStats(models.Model):
+    """Число постов автора в группе."""
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Группа'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    post_count = models.IntegerField('Постов', default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['group', 'author'],
+                name='unique group author'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['group', '-post_count'],
+                name='group_author_post_count'
+            ),
+        ]
+        verbose_name = 'Активность автора в группе'
+        verbose_name_plural = 'Активность авторов в группах'
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок, материализованная при публикации поста."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique timeline entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author'
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+
+
+class SearchTerm(models.Model):
+    """Слово обратного индекса поиска с весом его вхождений в пост.
+
+    Используется, когда база не поддерживает FTS5.
+    """
+    term = models.CharField('Слово', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пост'
+    )
+    weight = models.FloatField('Вес')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'post'], name='search_term_post'),
+        ]
+        verbose_name = 'Слово поиска'
+        verbose_name_plural = 'Обратный индекс поиска'
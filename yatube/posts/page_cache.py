@@ -0,0 +1,148 @@
+"""Кеш целых страниц для читателей без входа.
+
+PageCacheMiddleware сохраняет HTML страниц, построенных для анонимных
+посетителей представлениями с versioned, вместе с ETag их областей.
+Следующий GET того же адреса отдается из кеша без вызова
+представления, пока сигналы моделей не сменят версии этих областей.
+
+Части страницы, которые зависят от посетителя (меню, кнопки подписки
+и редактирования, форма комментария с CSRF-токеном), выводит тег hole.
+В сохраненной странице они отмечены комментариями HTML и при каждой
+выдаче рендерятся заново для текущего посетителя, поэтому вошедший
+пользователь получает ту же страницу со своими частями. После
+изменяющего запроса посетитель PAGE_CACHE_BYPASS_SECONDS секунд
+получает страницы мимо кеша и сразу видит свою запись.
+"""
+import hashlib
+import json
+import re
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from calendar import timegm
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import cache as versions
+from .utils import scopes_etag, scopes_last_modified
+
+PREFIX = 'page:'
+BYPASS_COOKIE = 'page_cache_bypass'
+SAFE_METHODS = ('GET', 'HEAD')
+HOLE = re.compile(r'<!--hole:([\w=-]+)-->(.*?)<!--/hole-->', re.S)
+
+
+def hole(request, template_name, params):
+    """Часть страницы для текущего посетителя.
+
+    Если страница будет сохранена, часть помечается для замены.
+    """
+    html = render_to_string(template_name, params, request=request)
+    if not getattr(request, 'page_cache', False):
+        return html
+    data = urlsafe_b64encode(
+        json.dumps([template_name, params]).encode()
+    ).decode()
+    return f'<!--hole:{data}-->{html}<!--/hole-->'
+
+
+def fill(content, request):
+    """Рендерит помеченные части страницы для посетителя."""
+    def render(match):
+        template_name, params = json.loads(urlsafe_b64decode(match[1]))
+        return render_to_string(template_name, params, request=request)
+    return HOLE.sub(render, content)
+
+
+def strip(content):
+    return HOLE.sub(lambda match: match[2], content)
+
+
+def page_key(request):
+    return PREFIX + hashlib.md5(
+        request.get_full_path().encode()
+    ).hexdigest()
+
+
+class PageCacheMiddleware:
+    """Отдает сохраненные страницы, не вызывая представления."""
+
+    def __init__(self, get_response):
+        if not settings.PAGE_CACHE_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            response.set_cookie(
+                BYPASS_COOKIE, '1',
+                max_age=settings.PAGE_CACHE_BYPASS_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+            return response
+        if BYPASS_COOKIE in request.COOKIES:
+            return self.get_response(request)
+        key = page_key(request)
+        entry = cache.get(key)
+        if entry is not None and versions.etag(
+            *entry['scopes']
+        ) == entry['etag']:
+            versions.record('page', 'hit')
+            return self.cached_response(request, entry)
+        request.page_cache = request.user.is_anonymous
+        response = self.get_response(request)
+        if not request.page_cache or response.streaming:
+            return response
+        content = response.content.decode(response.charset)
+        if self.cacheable(request, response):
+            versions.record('page', 'miss')
+            cache.set(key, {
+                'scopes': request.version_scopes,
+                'etag': request.page_cache_etag,
+                'per_user': request.version_per_user,
+                'content_type': response['Content-Type'],
+                'content': content,
+            }, settings.FRAGMENT_CACHE_TIMEOUT)
+        response.content = strip(content)
+        return response
+
+    def cacheable(self, request, response):
+        # Ответ с cookie (например, CSRF) принадлежит одному посетителю.
+        return (
+            response.status_code == 200
+            and response['Content-Type'].startswith('text/html')
+            and not response.cookies
+            and getattr(request, 'page_cache_etag', None) is not None
+            and not getattr(request, 'response_incomplete', False)
+        )
+
+    def cached_response(self, request, entry):
+        # Заголовки те же, что отдало бы представление с versioned,
+        # поэтому условный GET получает 304 и из кеша страниц.
+        etag = quote_etag(
+            scopes_etag(request, entry['scopes'], entry['per_user'])
+        )
+        last_modified = scopes_last_modified(
+            request, entry['scopes'], entry['per_user']
+        )
+        if last_modified is not None:
+            last_modified = timegm(last_modified.utctimetuple())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = HttpResponse(
+                fill(entry['content'], request),
+                content_type=entry['content_type']
+            )
+        response['X-Page-Cache'] = 'hit'
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Cookie',))
+        return response
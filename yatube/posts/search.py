@@ -0,0 +1,342 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Индекс обновляют сигналы сохранения и удаления постов и комментариев.
+Новый комментарий дописывается в индекс поста без чтения остальных
+комментариев, поэтому обсуждение не замедляется с ростом.
+На SQLite с FTS5 каждому посту соответствует строка виртуальной
+таблицы posts_search с rowid, равным id поста: в колонке text лежит
+текст поста, в колонке comments — тексты всех его комментариев.
+На остальных базах используется обратный индекс SearchTerm, который
+строится на Python. Совпадения в комментариях весят меньше совпадений
+в тексте поста.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.utils.module_loading import import_string
+
+from .models import Comment, Post, SearchTerm
+
+FTS_TABLE = 'posts_search'
+COMMENT_WEIGHT = 0.5
+# Длиннее запросы обрезаются: каждое слово — отдельный проход индекса.
+MAX_TERMS = 8
+BATCH_SIZE = 200
+# Вес, который после вычитаний считается нулевым.
+WEIGHT_EPSILON = 1e-6
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+# Тот же SQL создает индекс в миграции 0011_search.
+FILL_FTS_SQL = (
+    f'INSERT INTO {FTS_TABLE} (rowid, text, comments) '
+    'SELECT post.id, post.text, COALESCE(('
+    "SELECT group_concat(comment.text, ' ') FROM posts_comment comment "
+    "WHERE comment.post_id = post.id), '') FROM posts_post post"
+)
+
+
+def tokenize(text):
+    term_length = SearchTerm._meta.get_field('term').max_length
+    return [token[:term_length] for token in TOKEN_RE.findall(text.lower())]
+
+
+@lru_cache(maxsize=None)
+def fts5_available():
+    return (
+        connection.vendor == 'sqlite'
+        and FTS_TABLE in connection.introspection.table_names()
+    )
+
+
+def get_search_backend():
+    if settings.SEARCH_BACKEND:
+        return import_string(settings.SEARCH_BACKEND)()
+    if fts5_available():
+        return FTS5SearchBackend()
+    return InvertedIndexSearchBackend()
+
+
+def _comments_text(post_id):
+    return ' '.join(
+        Comment.objects.filter(post_id=post_id).values_list('text', flat=True)
+    )
+
+
+class SearchResults:
+    """Найденные посты в порядке релевантности.
+
+    Paginator вызывает count() и берет срез, поэтому запрашивается
+    только число совпадений и одна страница. По релевантности
+    упорядочены SEARCH_RANK_WINDOW самых новых совпадений: ранжирование
+    не проходит сотни тысяч строк частого слова. Остальные совпадения
+    идут за ними от новых к старым, поэтому считаются и доступны
+    на страницах все найденные посты.
+    """
+
+    def __init__(self, backend, terms):
+        self.backend = backend
+        self.terms = terms[:MAX_TERMS]
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = (
+                self.backend.count(self.terms) if self.terms else 0
+            )
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop = item.start or 0, item.stop
+        if not self.terms or stop is not None and stop <= start:
+            return []
+        window = settings.SEARCH_RANK_WINDOW
+        ids = []
+        if start < window:
+            ids = self.backend.ranked_ids(
+                self.terms, start, min(window, stop or window) - start
+            )
+        if stop is None or stop > window:
+            rest = max(start, window)
+            ids += self.backend.newest_ids(
+                self.terms, rest, None if stop is None else stop - rest
+            )
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+class FTS5SearchBackend:
+    """Индекс во встроенной в SQLite виртуальной таблице FTS5."""
+
+    def _execute(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def index_post(self, post, created):
+        if created:
+            self._execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, comments) '
+                "VALUES (%s, %s, '')", [post.pk, post.text]
+            )
+        else:
+            self._execute(
+                f'UPDATE {FTS_TABLE} SET text = %s WHERE rowid = %s',
+                [post.text, post.pk]
+            )
+
+    def index_comments(self, post_id):
+        self._execute(
+            f'UPDATE {FTS_TABLE} SET comments = %s WHERE rowid = %s',
+            [_comments_text(post_id), post_id]
+        )
+
+    def add_comments(self, post_id, texts):
+        self._execute(
+            f"UPDATE {FTS_TABLE} SET comments = comments || ' ' || %s "
+            'WHERE rowid = %s',
+            [' '.join(texts), post_id]
+        )
+
+    def remove_comments(self, post_id, texts):
+        # Удаление редко: колонка собирается заново из оставшихся.
+        self.index_comments(post_id)
+
+    def remove_post(self, post_id):
+        self._execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+    def rebuild(self):
+        self._execute(f'DELETE FROM {FTS_TABLE}')
+        self._execute(FILL_FTS_SQL)
+        self._execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"
+        )
+
+    def _match(self, terms):
+        # Каждое слово в кавычках: пользовательский ввод не попадает
+        # в синтаксис запросов FTS5.
+        return ' '.join(f'"{term}"' for term in terms)
+
+    # Окно ранжирования — самые новые совпадения: FTS5 отдает их
+    # по rowid без сортировки всего списка.
+    def _window(self):
+        return (
+            f'SELECT rowid, bm25({FTS_TABLE}, 1.0, %s) AS score '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            'ORDER BY rowid DESC LIMIT %s'
+        )
+
+    def count(self, terms):
+        return self._execute(
+            f'SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [self._match(terms)]
+        )[0][0]
+
+    def ranked_ids(self, terms, offset, limit):
+        rows = self._execute(
+            f'SELECT rowid FROM ({self._window()}) '
+            'ORDER BY score, rowid DESC LIMIT %s OFFSET %s',
+            [COMMENT_WEIGHT, self._match(terms), settings.SEARCH_RANK_WINDOW,
+             limit, offset]
+        )
+        return [row[0] for row in rows]
+
+    def newest_ids(self, terms, offset, limit):
+        rows = self._execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            'ORDER BY rowid DESC LIMIT %s OFFSET %s',
+            [self._match(terms), -1 if limit is None else limit, offset]
+        )
+        return [row[0] for row in rows]
+
+
+class InvertedIndexSearchBackend:
+    """Обратный индекс в таблице SearchTerm для любых баз данных.
+
+    Вес слова в посте — число вхождений в текст плюс COMMENT_WEIGHT
+    за каждое вхождение в комментарии. Выдача ранжируется по сумме
+    весов найденных слов, умноженных на их idf.
+    """
+
+    def _terms(self, text, comments):
+        weights = Counter(tokenize(text))
+        for term, count in Counter(tokenize(comments)).items():
+            weights[term] += count * COMMENT_WEIGHT
+        return weights
+
+    def _reindex(self, post_id, text, comments):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+        SearchTerm.objects.bulk_create(
+            (
+                SearchTerm(term=term, post_id=post_id, weight=weight)
+                for term, weight in self._terms(text, comments).items()
+            ),
+            batch_size=BATCH_SIZE
+        )
+
+    def _add_weights(self, post_id, weights):
+        """Прибавляет веса к словам поста; новые слова создаются."""
+        existing = set(SearchTerm.objects.filter(
+            post_id=post_id, term__in=weights
+        ).values_list('term', flat=True))
+        by_weight = defaultdict(list)
+        for term in existing:
+            by_weight[weights[term]].append(term)
+        for weight, terms in by_weight.items():
+            SearchTerm.objects.filter(
+                post_id=post_id, term__in=terms
+            ).update(weight=F('weight') + weight)
+        SearchTerm.objects.bulk_create(
+            (
+                SearchTerm(term=term, post_id=post_id, weight=weight)
+                for term, weight in weights.items()
+                if term not in existing and weight > 0
+            ),
+            batch_size=BATCH_SIZE
+        )
+
+    def index_post(self, post, created):
+        comments = '' if created else _comments_text(post.pk)
+        self._reindex(post.pk, post.text, comments)
+
+    def add_comments(self, post_id, texts):
+        self._add_weights(post_id, self._terms('', ' '.join(texts)))
+
+    def remove_comments(self, post_id, texts):
+        self._add_weights(post_id, {
+            term: -weight
+            for term, weight in self._terms('', ' '.join(texts)).items()
+        })
+        SearchTerm.objects.filter(
+            post_id=post_id, weight__lte=WEIGHT_EPSILON
+        ).delete()
+
+    def index_comments(self, post_id):
+        text = Post.objects.filter(pk=post_id).values_list(
+            'text', flat=True
+        ).first()
+        if text is not None:
+            self._reindex(post_id, text, _comments_text(post_id))
+
+    def remove_post(self, post_id):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+    def rebuild(self):
+        SearchTerm.objects.all().delete()
+        post_ids = Post.objects.order_by('id').values_list('id', flat=True)
+        last_id = 0
+        while True:
+            batch = dict(post_ids.filter(id__gt=last_id).values_list(
+                'id', 'text'
+            )[:BATCH_SIZE])
+            if not batch:
+                break
+            comments = defaultdict(list)
+            for post_id, text in Comment.objects.filter(
+                post_id__in=batch
+            ).values_list('post_id', 'text'):
+                comments[post_id].append(text)
+            SearchTerm.objects.bulk_create(
+                (
+                    SearchTerm(term=term, post_id=post_id, weight=weight)
+                    for post_id, text in batch.items()
+                    for term, weight in self._terms(
+                        text, ' '.join(comments[post_id])
+                    ).items()
+                ),
+                batch_size=BATCH_SIZE
+            )
+            last_id = max(batch)
+
+    def _matches(self, terms):
+        terms = set(terms)
+        return SearchTerm.objects.filter(term__in=terms).values(
+            'post'
+        ).annotate(matched=Count('term')).filter(matched=len(terms))
+
+    def count(self, terms):
+        return self._matches(terms).count()
+
+    def ranked_ids(self, terms, offset, limit):
+        matches = self._matches(terms)
+        # Окно ранжирования — самые новые совпадения, как у FTS5.
+        edge = matches.order_by('-post_id').values_list('post', flat=True)[
+            settings.SEARCH_RANK_WINDOW - 1:settings.SEARCH_RANK_WINDOW
+        ]
+        if edge:
+            matches = matches.filter(post__gte=edge[0])
+        total = Post.objects.count()
+        frequencies = dict(SearchTerm.objects.filter(
+            term__in=terms
+        ).values('term').annotate(posts=Count('post')).values_list(
+            'term', 'posts'
+        ))
+        score = Case(
+            *(
+                When(term=term, then=Value(
+                    math.log(1 + total / frequencies.get(term, 1))
+                ))
+                for term in set(terms)
+            ),
+            output_field=FloatField()
+        )
+        ranked = matches.annotate(
+            score=Sum(F('weight') * score, output_field=FloatField())
+        ).order_by('-score', '-post_id').values_list('post', flat=True)
+        return list(ranked[offset:offset + limit])
+
+    def newest_ids(self, terms, offset, limit):
+        newest = self._matches(terms).order_by('-post_id').values_list(
+            'post', flat=True
+        )
+        stop = None if limit is None else offset + limit
+        return list(newest[offset:stop])
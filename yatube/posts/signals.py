@@ -0,0 +1,203 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache, counters, users
+from .models import Comment, Follow, Group, GroupStats, Post, UserStats
+from .search import get_search_backend
+from .timeline import get_timeline_store
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def remember_names(sender, instance, raw=False, update_fields=None,
+                   **kwargs):
+    # Вход меняет только last_login: имя перечитывать не нужно.
+    if raw or instance.pk is None:
+        return
+    if update_fields is None or set(update_fields) & set(NAME_FIELDS):
+        instance._saved_names = User.objects.filter(
+            pk=instance.pk
+        ).values_list(*NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, update_fields=None, **kwargs):
+    # Новый пользователь тоже сбрасывает записи: SQLite может выдать
+    # ему id удаленного пользователя.
+    if update_fields is not None and not (
+        set(update_fields) & set(NAME_FIELDS)
+    ):
+        return
+    saved = getattr(instance, '_saved_names', None)
+    users.forget(instance.pk, instance.username, saved and saved[0])
+    if saved is not None and saved != tuple(
+        getattr(instance, field) for field in NAME_FIELDS
+    ):
+        # Имя выводится и во фрагментах страниц, и в их ETag, которые
+        # зависят только от своих областей. Переименования редки,
+        # поэтому сбрасывается все.
+        cache.bump(cache.GLOBAL_SCOPE)
+    else:
+        cache.bump(f'user:{instance.pk}')
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.author_id, post_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, post_count=-1)
+
+
+@receiver(post_save, sender=Group)
+def create_group_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        GroupStats.objects.get_or_create(group=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_group_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_group_id = None if created else getattr(
+        instance, '_saved_group_id', None
+    )
+    if old_group_id == instance.group_id:
+        return
+    if old_group_id is not None:
+        counters.bump_group(old_group_id, instance.author_id, -1)
+    if instance.group_id is not None:
+        counters.bump_group(
+            instance.group_id, instance.author_id, 1, instance.pub_date
+        )
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_group_post(sender, instance, **kwargs):
+    if instance.group_id is not None:
+        counters.bump_group(instance.group_id, instance.author_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.author_id, follower_count=1)
+        counters.bump_user(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, follower_count=-1)
+    counters.bump_user(instance.user_id, following_count=-1)
+
+
+# Лента читает счетчики подписчиков, поэтому ее обработчики
+# подключаются после обработчиков счетчиков.
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        get_timeline_store().add_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        get_timeline_store().follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    get_timeline_store().unfollow(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, raw=False, **kwargs):
+    if instance.pk is not None and not raw:
+        instance._saved_group_id = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    scopes = {
+        'index', f'profile:{instance.author_id}', f'post:{instance.pk}',
+        f'card:{instance.pk}'
+    }
+    for group_id in (instance.group_id,
+                     getattr(instance, '_saved_group_id', None)):
+        if group_id is not None:
+            scopes.update((f'group:{group_id}', 'groups'))
+    cache.bump(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    cache.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    # Ссылки на группу есть в карточках постов всех лент.
+    cache.bump(cache.GLOBAL_SCOPE, f'group:{instance.pk}', 'groups')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    cache.bump(f'follow:{instance.user_id}', f'profile:{instance.author_id}')
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index_post(instance, created)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_search_backend().remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        get_search_backend().add_comments(instance.post_id, [instance.text])
+    else:
+        get_search_backend().index_comments(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    get_search_backend().remove_comments(instance.post_id, [instance.text])
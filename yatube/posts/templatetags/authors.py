@@ -0,0 +1,33 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import format_html
+
+from posts import users
+
+register = template.Library()
+
+
+@register.simple_tag
+def author_name(user_id):
+    """Полное имя автора по id без запроса к auth_user."""
+    ref = users.by_id([user_id]).get(user_id)
+    return ref.full_name if ref else ''
+
+
+@register.simple_tag
+def author_link(user_id, text=None):
+    """Ссылка на профиль автора по id без запроса к auth_user."""
+    ref = users.by_id([user_id]).get(user_id)
+    if ref is None:
+        return text or ''
+    return format_html(
+        '<a href="{}">{}</a>',
+        reverse('posts:profile', args=(ref.username,)), text or ref.name
+    )
+
+
+@register.simple_tag
+def prefetch_authors(objects):
+    """Загружает авторов списка одним запросом; ничего не выводит."""
+    users.by_id({obj.author_id for obj in objects})
+    return ''
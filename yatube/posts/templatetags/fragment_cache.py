@@ -0,0 +1,120 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.utils.safestring import mark_safe
+
+from core.routers import using_replica
+from posts import users
+from posts.cache import (card_keys, changed_recently, fragment_key,
+                         get_or_compute, record)
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+CARD_VARIANTS = {
+    'feed': {'show_author': True, 'show_group': True},
+    'group': {'show_author': True, 'show_group': False},
+    'profile': {'show_author': False, 'show_group': True},
+}
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, name, scope, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.scope = scope
+        self.vary_on = vary_on
+
+    def render(self, context):
+        scope = self.scope.resolve(context)
+        key = fragment_key(
+            self.name, scope, [var.resolve(context) for var in self.vary_on]
+        )
+        # Фрагмент с отстающей реплики не кешируется под новой версией.
+        state = {'complete': not (
+            using_replica() and changed_recently(scope)
+        )}
+
+        def render():
+            with context.push(fragment_cache_state=state):
+                return self.nodelist.render(context)
+
+        # Фрагмент с заглушками вместо еще не готовых данных
+        # не кешируется, чтобы заглушки не жили часами.
+        return get_or_compute(
+            key, render, settings.FRAGMENT_CACHE_TIMEOUT,
+            kind=scope.split(':', 1)[0],
+            cacheable=lambda value: state['complete']
+        )
+
+
+@register.tag
+def fragment_cache(parser, token):
+    """Кеширует фрагмент до изменения данных его области.
+
+    {% fragment_cache name scope [var1] [var2] ... %}
+        ...
+    {% endfragment_cache %}
+    """
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.'
+        )
+    return FragmentCacheNode(
+        nodelist,
+        tokens[1],
+        parser.compile_filter(tokens[2]),
+        [parser.compile_filter(t) for t in tokens[3:]],
+    )
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, variant='feed'):
+    """HTML карточек постов ленты, собранный из кеша одним get_many.
+
+    {% post_cards page_obj ['feed'|'group'|'profile'] as cards %}
+
+    Недостающие карточки рендерятся и сохраняются одним set_many.
+    Карточка с заглушкой миниатюры не сохраняется.
+    """
+    posts = list(posts)
+    keys = card_keys(posts, variant)
+    found = cache.get_many(keys)
+    missing = [
+        (key, post) for key, post in zip(keys, posts) if key not in found
+    ]
+    record('card', 'hit', len(posts) - len(missing))
+    record('card', 'miss', len(missing))
+    if missing:
+        found.update(_render_cards(context, missing, variant))
+    return [mark_safe(found[key]) for key in keys]
+
+
+def _render_cards(context, missing, variant):
+    card = context.template.engine.get_template(CARD_TEMPLATE)
+    users.by_id({post.author_id for _, post in missing})
+    prefetch_related_objects(
+        [post for _, post in missing if post.image], 'image_variants'
+    )
+    # Карточки с отстающей реплики не кешируются под новой версией.
+    stale = using_replica() and changed_recently(*(
+        f'card:{post.pk}' for _, post in missing
+    ))
+    outer_state = context.get('fragment_cache_state')
+    rendered = {}
+    complete = {}
+    for key, post in missing:
+        state = {'complete': not stale}
+        with context.push(post=post, fragment_cache_state=state,
+                          **CARD_VARIANTS[variant]):
+            rendered[key] = card.render(context)
+        if state['complete']:
+            complete[key] = rendered[key]
+        elif outer_state is not None:
+            outer_state['complete'] = False
+    cache.set_many(complete, settings.FRAGMENT_CACHE_TIMEOUT)
+    return rendered
@@ -0,0 +1,35 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts import page_cache
+from posts.forms import CommentForm
+from posts.models import Follow
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **params):
+    """Часть страницы, которая рендерится для каждого посетителя.
+
+    {% hole 'template.html' name=value ... %}
+
+    Шаблон получает только переданные значения (числа и строки)
+    и переменные контекстных процессоров.
+    """
+    return mark_safe(
+        page_cache.hole(context.get('request'), template_name, params)
+    )
+
+
+@register.simple_tag(takes_context=True)
+def is_following(context, author_id):
+    user = context['request'].user
+    return user.is_authenticated and Follow.objects.filter(
+        user=user, author_id=author_id
+    ).exists()
+
+
+@register.simple_tag
+def comment_form():
+    return CommentForm()
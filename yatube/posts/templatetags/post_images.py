@@ -0,0 +1,56 @@
+from django import template
+from django.conf import settings
+
+from posts.thumbnails import FAILED, FORMATS, schedule, variant_storage
+
+register = template.Library()
+
+
+def _srcset(variants):
+    return ', '.join(
+        f'{variant_storage.url(variant.name)} {variant.width}w'
+        for variant in variants
+    )
+
+
+@register.inclusion_tag('posts/includes/picture.html', takes_context=True)
+def picture(context, post):
+    """<picture> со srcset из готовых вариантов картинки поста.
+
+    Варианты берутся из post.image_variants, загруженных вместе
+    с постом; пока их нет, выводится заглушка, а если их не удалось
+    создать — исходная картинка.
+    """
+    if not post.image:
+        return {}
+    found = {}
+    for variant in post.image_variants.all():
+        if variant.source == post.image.name:
+            found.setdefault(variant.format, []).append(variant)
+    if FAILED in found:
+        return {'post': post, 'original': True}
+    if 'jpeg' not in found:
+        schedule(post)
+        state = context.get('fragment_cache_state')
+        if state is not None:
+            state['complete'] = False
+        # Без ETag: страница изменится, когда варианты будут готовы.
+        request = context.get('request')
+        if request is not None:
+            request.response_incomplete = True
+        return {'post': post, 'aspect': settings.POST_IMAGE_ASPECT}
+    for variants in found.values():
+        variants.sort(key=lambda variant: variant.width)
+    fallback = found['jpeg']
+    return {
+        'post': post,
+        'sources': [
+            {'type': FORMATS[name][2], 'srcset': _srcset(found[name])}
+            for name in settings.POST_IMAGE_FORMATS
+            if name != 'jpeg' and name in found
+        ],
+        'image': fallback[-1],
+        'src': variant_storage.url(fallback[-1].name),
+        'srcset': _srcset(fallback),
+        'sizes': settings.POST_IMAGE_SIZES,
+    }
@@ -0,0 +1,133 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-group', description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'Пост {i}', group=cls.group)
+            for i in range(14)
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Новый пост', group=cls.group
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def lines(self, response):
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(
+            response['Content-Type'], 'application/x-ndjson; charset=utf-8'
+        )
+        return [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).splitlines()
+        ]
+
+    def test_feed_pages(self):
+        """Лента отдается построчно, курсор ведет на следующую страницу"""
+        lines = self.lines(self.client.get(reverse('posts:api_index')))
+        self.assertEqual(
+            [line['type'] for line in lines], ['post'] * 10 + ['next']
+        )
+        self.assertEqual(lines[0]['data']['text'], 'Новый пост')
+        self.assertEqual(lines[0]['data']['group'], 'test-group')
+        # Комментарии не меняют ETag ленты, поэтому их числа в ней нет.
+        self.assertNotIn('comment_count', lines[0]['data'])
+        rest = self.lines(self.client.get(
+            reverse('posts:api_index'), {'cursor': lines[-1]['data']['cursor']}
+        ))
+        self.assertEqual([line['type'] for line in rest], ['post'] * 5)
+        ids = [line['data']['id'] for line in lines[:-1] + rest]
+        self.assertEqual(len(set(ids)), 15)
+
+    def test_endpoints(self):
+        """Группа, профиль, подписки и список групп отдают свои записи"""
+        self.client.force_login(self.reader)
+        addresses = {
+            reverse('posts:api_group_list', args=(self.group.slug,)): 'post',
+            reverse('posts:api_profile', args=(self.author.username,)): 'post',
+            reverse('posts:api_follow_index'): 'post',
+            reverse('posts:api_groups'): 'group',
+        }
+        for address, kind in addresses.items():
+            with self.subTest(address=address):
+                lines = self.lines(self.client.get(address, {'limit': 20}))
+                self.assertEqual(lines[0]['type'], kind)
+
+    def test_post_detail(self):
+        """Страница поста: сначала пост, затем комментарии"""
+        lines = self.lines(self.client.get(
+            reverse('posts:api_post_detail', args=(self.post.id,))
+        ))
+        self.assertEqual([line['type'] for line in lines], ['post', 'comment'])
+        self.assertEqual(lines[0]['data']['comment_count'], 1)
+        self.assertEqual(lines[1]['data']['author'], 'reader')
+
+    def test_comment_changes_post_etag(self):
+        """Новый комментарий меняет ETag страницы поста"""
+        address = reverse('posts:api_post_detail', args=(self.post.id,))
+        etag = self.client.get(address)['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Еще комментарий'
+        )
+        response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.lines(response)[0]['data']['comment_count'], 2)
+
+    def test_errors(self):
+        """Неверные параметры дают 400, чужие адреса 404,
+        лента подписок без входа 401
+        """
+        address = reverse('posts:api_index')
+        for params in ({'limit': 'много'}, {'limit': 0}, {'limit': 101},
+                       {'cursor': 'испорчен'}):
+            with self.subTest(params=params):
+                response = self.client.get(address, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+        response = self.client.get(
+            reverse('posts:api_group_list', args=('missing',))
+        )
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('posts:api_follow_index'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_conditional_get(self):
+        """Неизмененная страница отдается ответом 304,
+        новый пост меняет ETag
+        """
+        address = reverse('posts:api_profile', args=(self.author.username,))
+        response = self.client.get(address)
+        etag = response['ETag']
+        response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            address, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=self.author, text='Еще пост')
+        response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
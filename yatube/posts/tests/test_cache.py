@@ -1,9 +1,19 @@
+import threading
+import time
+from unittest import mock
+
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.db import transaction
+from django.test import (
+    Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
 from django.urls import reverse
 
-from ..models import Post
+from ..cache import (
+    LOCK_PREFIX, get_or_compute, get_versions, stats, stats_buffer
+)
+from ..models import Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -14,23 +24,242 @@ class PostsCacheTest(TestCase):
         super().setUpClass()
         cls.client = Client()
         cls.user = User.objects.create_user(username='testuser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Описание тестовой группы'
+        )
         cls.post = Post.objects.create(
             text='Тестовый текст',
             author=cls.user,
+            group=cls.group,
         )
 
+    def setUp(self):
+        stats_buffer.flush()
+        cache.clear()
+
     def test_index_cached(self):
         """Страница индекс кешируется"""
         response = self.client.get(reverse('posts:index'))
         start_content = response.content
-        self.post.delete()
-        self.assertIn(self.post.text, response.content.decode())
+        # Обновление в обход сигналов не сбрасывает кеш.
+        Post.objects.filter(pk=self.post.pk).update(text='Скрытый текст')
         response = self.client.get(reverse('posts:index'))
-        deleted_post_content = response.content
-        self.assertIn(self.post.text, response.content.decode())
+        self.assertEqual(start_content, response.content)
         cache.clear()
         response = self.client.get(reverse('posts:index'))
-        clear_cache_content = response.content
-        self.assertNotIn(self.post.text, response.content.decode())
-        self.assertEqual(start_content, deleted_post_content)
-        self.assertNotEqual(start_content, clear_cache_content)
+        self.assertIn('Скрытый текст', response.content.decode())
+
+    def test_pages_invalidated_on_change(self):
+        """Изменение поста сразу сбрасывает кеш страниц с ним"""
+        addresses = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:post_detail', args=(self.post.id,)),
+        ]
+        for address in addresses:
+            self.client.get(address)
+        self.post.text = 'Новый текст'
+        self.post.save()
+        for address in addresses:
+            with self.subTest(address=address):
+                response = self.client.get(address)
+                self.assertIn('Новый текст', response.content.decode())
+
+    def test_comment_invalidates_post_detail(self):
+        """Новый комментарий сбрасывает кеш страницы поста"""
+        address = reverse('posts:post_detail', args=(self.post.id,))
+        self.client.get(address)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий'
+        )
+        response = self.client.get(address)
+        self.assertIn('Комментарий', response.content.decode())
+
+    def test_fragment_stats(self):
+        """Попадания, промахи и сбросы считаются по видам фрагментов"""
+        # Вошедшему пользователю страница собирается из фрагментов.
+        self.client.force_login(self.user)
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        Post.objects.create(text='Еще пост', author=self.user)
+        index_stats = stats()['index']
+        self.assertEqual(index_stats['miss'], 1)
+        self.assertEqual(index_stats['hit'], 1)
+        self.assertEqual(index_stats['invalidation'], 1)
+
+    def test_hits_counted_in_memory(self):
+        """Попадание не пишет счетчик в общий кеш до переноса"""
+        address = reverse('posts:index')
+        self.client.force_login(self.user)
+        self.client.get(address)
+        stats_buffer.flush()
+        with mock.patch.object(cache, 'incr') as incr:
+            self.client.get(address)
+        incr.assert_not_called()
+        self.assertEqual(stats()['index']['hit'], 1)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(3):
+            Post.objects.create(text=f'Пост {number}', author=cls.author)
+
+    def setUp(self):
+        stats_buffer.flush()
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def test_cards_shared_between_feeds(self):
+        """Карточки, построенные для одной ленты, используются в другой"""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(stats()['card'], {
+            'hit': 3, 'miss': 3, 'invalidation': 0
+        })
+
+    def test_new_post_renders_only_its_card(self):
+        """Новый пост не сбрасывает карточки остальных постов"""
+        address = reverse('posts:follow_index')
+        self.client.get(address)
+        Post.objects.create(text='Новый пост', author=self.author)
+        response = self.client.get(address)
+        self.assertContains(response, 'Новый пост')
+        card_stats = stats()['card']
+        self.assertEqual((card_stats['hit'], card_stats['miss']), (3, 4))
+
+    def test_author_rename_invalidates_cards(self):
+        """Новое имя автора появляется в его карточках"""
+        address = reverse('posts:follow_index')
+        self.client.get(address)
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Федор'
+        author.save()
+        response = self.client.get(address)
+        self.assertContains(response, 'Федор', count=3)
+
+    def test_author_rename_invalidates_pages(self):
+        """Новое имя автора сразу видно на страницах с внешними
+        фрагментами, а старый ETag не дает 304
+        """
+        post = Post.objects.filter(author=self.author).first()
+        addresses = [
+            reverse('posts:index'),
+            reverse('posts:profile', args=('author',)),
+            reverse('posts:post_detail', args=(post.id,)),
+        ]
+        etags = {
+            address: self.client.get(address)['ETag']
+            for address in addresses
+        }
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Федор'
+        author.save()
+        for address in addresses:
+            with self.subTest(address=address):
+                response = self.client.get(
+                    address, HTTP_IF_NONE_MATCH=etags[address]
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Федор')
+                self.assertNotContains(response, 'Лев')
+
+    def test_save_without_rename_keeps_pages(self):
+        """Сохранение пользователя без смены имени не сбрасывает кеш"""
+        address = reverse('posts:index')
+        etag = self.client.get(address)['ETag']
+        author = User.objects.get(pk=self.author.pk)
+        author.set_password('новый-пароль')
+        author.save()
+        response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class BumpOnCommitTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+
+    def test_versions_bumped_after_commit(self):
+        """Версии меняются и после фиксации транзакции: фрагмент,
+        сохраненный до нее со старыми строками, не используется
+        """
+        with transaction.atomic():
+            Post.objects.create(text='Новый пост', author=self.user)
+            inside = get_versions('index', f'profile:{self.user.pk}')
+        self.assertNotEqual(
+            get_versions('index', f'profile:{self.user.pk}'), inside
+        )
+
+    def test_rollback_keeps_new_versions(self):
+        """Откат не возвращает старые версии"""
+        before = get_versions('index')
+        with transaction.atomic():
+            Post.objects.create(text='Новый пост', author=self.user)
+            inside = get_versions('index')
+            transaction.set_rollback(True)
+        self.assertNotEqual(inside, before)
+        self.assertEqual(get_versions('index'), inside)
+
+
+class GetOrComputeTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        time.sleep(0.05)
+        return f'значение {self.calls}'
+
+    def test_concurrent_misses_compute_once(self):
+        """Одновременные промахи считают значение один раз"""
+        results = []
+
+        def work():
+            results.append(get_or_compute('key', self.compute, 60))
+
+        threads = [threading.Thread(target=work) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['значение 1'] * 5)
+
+    def test_stale_value_while_locked(self):
+        """Пока значение пересчитывает другой запрос, отдается прежнее"""
+        get_or_compute('key', self.compute, 60)
+        cache.add(LOCK_PREFIX + 'key', 1)
+        with mock.patch('posts.cache._expires_early', return_value=True):
+            value = get_or_compute('key', self.compute, 60)
+        self.assertEqual(value, 'значение 1')
+        self.assertEqual(self.calls, 1)
+
+    @override_settings(CACHE_COMPUTE_WAIT=0.1)
+    def test_abandoned_lock(self):
+        """Не дождавшись чужого пересчета, запрос считает значение сам"""
+        cache.add(LOCK_PREFIX + 'key', 1)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 'значение 1')
+
+    def test_early_recompute(self):
+        """Близкое к истечению значение заранее пересчитывается"""
+        get_or_compute('key', self.compute, 0.5)
+        # random() около нуля: срок будто бы уже наступил.
+        with mock.patch('posts.cache.random.random', return_value=1e-300):
+            value = get_or_compute('key', self.compute, 60)
+        self.assertEqual(value, 'значение 2')
+
+    def test_not_cacheable(self):
+        """Значение, которое нельзя кешировать, не сохраняется"""
+        get_or_compute('key', self.compute, 60, cacheable=lambda v: False)
+        get_or_compute('key', self.compute, 60)
+        self.assertEqual(self.calls, 2)
@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..comment_buffer import writer
+from ..models import Comment, Post
+from ..search import SearchResults, get_search_backend, tokenize
+
+User = get_user_model()
+
+
+@override_settings(COMMENT_WRITE_BEHIND=True)
+class CommentBufferTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.addCleanup(writer.flush)
+
+    def comment(self, text, post=None):
+        post = post or self.post
+        return self.client.post(
+            reverse('posts:add_comment', args=(post.id,)), {'text': text}
+        )
+
+    def buffer(self, text, post=None):
+        """Комментарий соседнего запроса, который еще ждет записи."""
+        writer.add(Comment(
+            post=post or self.post, author=self.author, text=text
+        ))
+
+    def test_comment_saved_before_redirect(self):
+        """Комментарий сохранен до редиректа на страницу поста"""
+        response = self.comment('Мой комментарий')
+        self.assertRedirects(
+            response, reverse('posts:post_detail', args=(self.post.id,)),
+            fetch_redirect_response=False
+        )
+        self.assertEqual(Comment.objects.get().text, 'Мой комментарий')
+        self.assertEqual(writer.stats()['buffered'], 0)
+
+    def test_invalid_comment_not_buffered(self):
+        """Пустой комментарий не попадает в буфер"""
+        self.comment('')
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(writer.stats()['buffered'], 0)
+
+    def test_author_reads_own_comment(self):
+        """Автор комментария сразу видит его на странице поста"""
+        self.comment('Мой комментарий')
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.id,))
+        )
+        self.assertContains(response, 'Мой комментарий')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_buffer_saved_in_one_batch(self):
+        """Запрос сохраняет и комментарии соседних запросов одной пачкой"""
+        self.buffer('Первый')
+        self.buffer('Второй')
+        batches = writer.stats()['batches']
+        self.comment('Третий')
+        self.assertEqual(writer.stats()['batches'], batches + 1)
+        self.assertEqual(Comment.objects.count(), 3)
+
+    def test_batch_does_signal_work(self):
+        """Пачка обновляет счетчики и поисковый индекс"""
+        for number in range(2):
+            self.buffer(f'Черничный пирог {number}')
+        self.comment('Черничный пирог 2')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+        results = SearchResults(get_search_backend(), tokenize('черничный'))
+        self.assertEqual(list(results), [self.post])
+
+    def test_deleted_post_skipped(self):
+        """Комментарии к удаленному посту отбрасываются без ошибки"""
+        other = Post.objects.create(author=self.author, text='Другой пост')
+        self.buffer('Комментарий', post=other)
+        other.delete()
+        failed = writer.stats()['failed']
+        self.comment('Комментарий')
+        self.assertEqual(writer.stats()['failed'], failed)
+        self.assertEqual(Comment.objects.get().post, self.post)
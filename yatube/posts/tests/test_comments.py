@@ -0,0 +1,96 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import users
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_PER_PAGE=3, PAGE_CACHE_ENABLED=False)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        for number in range(7):
+            commenter = User.objects.create_user(username=f'user{number}')
+            Comment.objects.create(
+                post=cls.post, author=commenter, text=f'Комментарий {number}'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def texts(self, comments):
+        return [comment.text for comment in comments]
+
+    def test_first_page_limited(self):
+        """Страница поста выводит только первую страницу комментариев"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.id,))
+        )
+        comments = response.context['comments']
+        self.assertEqual(
+            self.texts(comments),
+            ['Комментарий 6', 'Комментарий 5', 'Комментарий 4']
+        )
+        self.assertContains(
+            response, reverse('posts:post_comments', args=(self.post.id,))
+        )
+
+    def test_queries_do_not_grow(self):
+        """Число запросов не зависит от числа комментариев и авторов"""
+        address = reverse('posts:post_detail', args=(self.post.id,))
+        self.client.get(address)
+        cache.clear()
+        users.by_id(User.objects.values_list('id', flat=True))
+        with self.assertNumQueries(2):
+            self.client.get(address)
+
+    def test_fragment_pages(self):
+        """Следующие страницы отдаются HTML-фрагментом по курсору"""
+        address = reverse('posts:post_comments', args=(self.post.id,))
+        texts = []
+        cursor = ''
+        for _ in range(3):
+            response = self.client.get(address, {'cursor': cursor})
+            texts += self.texts(response.context['comments'])
+            cursor = response.context['comments'].next_cursor
+        self.assertIsNone(cursor)
+        self.assertEqual(texts, [f'Комментарий {n}' for n in range(6, -1, -1)])
+        self.assertNotContains(response, 'Показать еще')
+
+    def test_json_pages(self):
+        """Фрагмент отдается и в JSON с курсором следующей страницы"""
+        address = reverse('posts:post_comments', args=(self.post.id,))
+        data = self.client.get(address, {'format': 'json'}).json()
+        self.assertEqual(len(data['comments']), 3)
+        self.assertEqual(data['comments'][0]['author'], 'user6')
+        data = self.client.get(
+            address, {'format': 'json', 'cursor': data['next']}
+        ).json()
+        self.assertEqual(data['comments'][0]['text'], 'Комментарий 3')
+
+    def test_post_detail_cursor(self):
+        """Ссылка без JavaScript открывает страницу поста со следующими
+        комментариями
+        """
+        address = reverse('posts:post_detail', args=(self.post.id,))
+        first = self.client.get(address).context['comments']
+        response = self.client.get(
+            address, {'comments': first.next_cursor}
+        )
+        self.assertEqual(
+            self.texts(response.context['comments']),
+            ['Комментарий 3', 'Комментарий 2', 'Комментарий 1']
+        )
+
+    def test_missing_post(self):
+        """Комментарии несуществующего поста дают 404"""
+        response = self.client.get(
+            reverse('posts:post_comments', args=(10 ** 6,))
+        )
+        self.assertEqual(response.status_code, 404)
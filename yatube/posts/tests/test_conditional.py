@@ -0,0 +1,152 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Тестовый пост', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.addresses = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list', args=(self.group.slug,)),
+            'profile': reverse('posts:profile', args=(self.author.username,)),
+            'post': reverse('posts:post_detail', args=(self.post.id,)),
+        }
+
+    def assertNotModified(self, client, address, **headers):
+        response = client.get(address, **headers)
+        self.assertEqual(response.status_code, 304)
+
+    def assertModified(self, client, address, **headers):
+        response = client.get(address, **headers)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unchanged_pages_not_modified(self):
+        """Неизмененные страницы отдаются ответом 304"""
+        for name, address in self.addresses.items():
+            with self.subTest(page=name):
+                response = self.guest.get(address)
+                self.assertNotModified(
+                    self.guest, address, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertNotModified(
+                    self.guest, address,
+                    HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+
+    def test_not_modified_costs_one_lookup(self):
+        """Ответ 304 представления стоит не больше одного запроса к базе"""
+        # Страницы вошедшего пользователя не сохраняются в кеше страниц:
+        # 304 отдает представление, а сессия и пользователь стоят еще
+        # двух запросов.
+        client = Client()
+        client.force_login(self.reader)
+        for name, address in self.addresses.items():
+            with self.subTest(page=name):
+                etag = client.get(address)['ETag']
+                # Автора профиля находит словарь пользователей в кеше.
+                with self.assertNumQueries(
+                    2 if name in ('index', 'profile') else 3
+                ):
+                    self.assertNotModified(
+                        client, address, HTTP_IF_NONE_MATCH=etag
+                    )
+
+    def test_changes_modify_pages(self):
+        """Изменения данных меняют ETag страниц, которые их показывают"""
+        etags = {
+            name: self.guest.get(address)['ETag']
+            for name, address in self.addresses.items()
+        }
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        self.assertModified(
+            self.guest, self.addresses['post'],
+            HTTP_IF_NONE_MATCH=etags['post']
+        )
+        self.assertNotModified(
+            self.guest, self.addresses['index'],
+            HTTP_IF_NONE_MATCH=etags['index']
+        )
+        Post.objects.create(author=self.author, text='Новый пост')
+        for name in ('index', 'profile', 'post'):
+            with self.subTest(page=name):
+                self.assertModified(
+                    self.guest, self.addresses[name],
+                    HTTP_IF_NONE_MATCH=etags[name]
+                )
+        Follow.objects.create(user=self.author, author=self.reader)
+        etag = self.guest.get(self.addresses['profile'])['ETag']
+        Follow.objects.filter(user=self.author).delete()
+        self.assertModified(
+            self.guest, self.addresses['profile'], HTTP_IF_NONE_MATCH=etag
+        )
+
+    def test_pages_differ_per_user(self):
+        """ETag зависит от пользователя, вошедшим не отдается Last-Modified"""
+        address = self.addresses['post']
+        response = self.guest.get(address)
+        client = Client()
+        client.force_login(self.reader)
+        self.assertModified(
+            client, address, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        response = client.get(address)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertNotModified(
+            client, address, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+
+    def test_static_pages_differ_per_user(self):
+        """Вошедший пользователь не получает 304 на статическую страницу
+        по ETag анонима
+        """
+        address = reverse('about:author')
+        response = self.guest.get(address)
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(address, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Пользователь: reader')
+
+    @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+    def test_placeholder_pages_not_validated(self):
+        """Страница с заглушкой миниатюры отдается без ETag"""
+        Post.objects.create(
+            author=self.author, text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', b'GIF89a', content_type='image/gif'
+            )
+        )
+        response = self.guest.get(self.addresses['index'])
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
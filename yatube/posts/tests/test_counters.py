@@ -0,0 +1,80 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counter(self):
+        """Счетчик постов автора меняется при создании и удалении"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(self.stats(self.author).post_count, 2)
+        post.delete()
+        self.assertEqual(self.stats(self.author).post_count, 1)
+
+    def test_comment_counter(self):
+        """Счетчик комментариев поста меняется при создании и удалении"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+    def test_follow_counters_with_cascade(self):
+        """Счетчики подписок учитывают каскадное удаление"""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        self.assertEqual(self.stats(self.author).follower_count, 2)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        fan.delete()
+        self.assertEqual(self.stats(self.author).follower_count, 1)
+
+    def test_recount_fixes_drift(self):
+        """Команда recount_counters исправляет расхождения"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        UserStats.objects.filter(user=self.author).update(post_count=10)
+        Post.objects.filter(pk=post.pk).update(comment_count=5)
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(self.stats(self.author).post_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+    def test_pages_show_counters(self):
+        """Страницы показывают счетчики без агрегирующих запросов"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        for address in (
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(post.id,)),
+        ):
+            with self.subTest(address=address):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(address)
+                for query in queries:
+                    self.assertNotIn('COUNT(', query['sql'])
+                self.assertEqual(
+                    response.context['author_stats'].post_count, 1
+                )
@@ -1,8 +1,14 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Follow, Post
+from .. import follows, users
+from ..models import Follow, Post, UserStats
 
 User = get_user_model()
 
@@ -68,3 +74,146 @@ class PostsFormsTests(TestCase):
         )
         self.assertIn(new_post, follower_response.context['page_obj'])
         self.assertNotIn(new_post, non_follower_response.context['page_obj'])
+
+
+class FollowWritePathTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.follower = User.objects.create_user(username='follower')
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.follower)
+
+    def follow_url(self, username):
+        return reverse('posts:profile_follow', args=(username,))
+
+    def test_follow_idempotent(self):
+        """Повторная подписка не создает строку и не меняет счетчики"""
+        for _ in range(2):
+            self.client.post(self.follow_url('author'))
+        self.assertEqual(Follow.objects.filter(user=self.follower).count(), 1)
+        self.assertEqual(UserStats.objects.get(
+            user=self.author
+        ).follower_count, 1)
+
+    def test_ajax_follow_returns_json(self):
+        """Запрос из скрипта получает JSON вместо перенаправления"""
+        response = self.client.post(
+            self.follow_url('author'), HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.json(), {
+            'username': 'author', 'following': True, 'changed': True
+        })
+        response = self.client.post(
+            reverse('posts:profile_unfollow', args=('author',)),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.json(), {
+            'username': 'author', 'following': False, 'changed': True
+        })
+        self.assertEqual(UserStats.objects.get(
+            user=self.author
+        ).follower_count, 0)
+
+    def test_unknown_author(self):
+        """Подписка на несуществующего автора возвращает 404"""
+        response = self.client.post(self.follow_url('nobody'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_username_cached(self):
+        """Повторная подписка не ищет автора по username"""
+        self.client.post(self.follow_url('author'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.follow_url('author'))
+        self.assertFalse(any(
+            '"username" IN' in query['sql'] for query in queries
+        ))
+
+    def test_renamed_user_forgotten(self):
+        """Смена username сбрасывает его в словаре id"""
+        self.assertEqual(
+            users.by_username(['author'])['author'].id, self.author.pk
+        )
+        self.author.username = 'renamed'
+        self.author.save()
+        self.assertEqual(users.by_username(['author']), {})
+        response = self.client.post(self.follow_url('renamed'))
+        self.assertRedirects(
+            response, reverse('posts:profile', args=('renamed',))
+        )
+
+    def test_bulk_follow(self):
+        """Подписка списком создает только новые подписки"""
+        Follow.objects.create(user=self.follower, author=self.other)
+        response = self.client.post(reverse('posts:follow_bulk'), {
+            'username': ['author', 'other', 'follower', 'nobody']
+        })
+        self.assertEqual(response.json(), {
+            'followed': ['author'], 'missing': ['nobody']
+        })
+        self.assertEqual(
+            set(self.follower.follower.values_list('author', flat=True)),
+            {self.author.pk, self.other.pk}
+        )
+        self.assertEqual(UserStats.objects.get(
+            user=self.follower
+        ).following_count, 2)
+
+    @override_settings(FOLLOW_BULK_LIMIT=1)
+    def test_bulk_follow_limit(self):
+        """Слишком длинный список отклоняется"""
+        response = self.client.post(reverse('posts:follow_bulk'), {
+            'username': ['author', 'other']
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Follow.objects.exists())
+
+
+class FollowWithoutReturningTest(TestCase):
+    """SQLite старше 3.35 без RETURNING."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.follower = User.objects.create_user(username='follower')
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.follower)
+        patcher = mock.patch.object(
+            connection.Database, 'sqlite_version_info', (3, 31, 1)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_follow_and_unfollow(self):
+        """Подписка и отписка работают и меняют счетчики один раз"""
+        self.assertFalse(follows.returning_supported())
+        for _ in range(2):
+            response = self.client.post(
+                reverse('posts:profile_follow', args=('author',))
+            )
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            follows.follow(self.follower.pk, [self.author.pk, self.other.pk]),
+            [self.other.pk]
+        )
+        self.assertEqual(UserStats.objects.get(
+            user=self.author
+        ).follower_count, 1)
+        self.assertEqual(Follow.objects.filter(user=self.follower).count(), 2)
+        for _ in range(2):
+            self.client.post(
+                reverse('posts:profile_unfollow', args=('author',))
+            )
+        self.assertEqual(follows.unfollow(
+            self.follower.pk, [self.author.pk, self.other.pk]
+        ), [self.other.pk])
+        self.assertEqual(UserStats.objects.get(
+            user=self.author
+        ).follower_count, 0)
+        self.assertFalse(Follow.objects.filter(user=self.follower).exists())
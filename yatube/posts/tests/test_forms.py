@@ -13,6 +13,7 @@ User = get_user_model()
 
 
 # В конце добавил тесты для проверки комментариев
+@override_settings(PAGE_CACHE_ENABLED=False)
 class PostsFormsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -157,11 +158,26 @@ class PostsFormsTests(TestCase):
             comments_count
         )
 
+    def test_empty_comment_not_saved(self):
+        """Пустой комментарий не сохраняется и не ломает страницу"""
+        comments_count = Comment.objects.filter(post=self.post).count()
+        response = self.authorized_client.post(
+            reverse('posts:add_comment', args={self.post.id}),
+            data={'text': ''},
+        )
+        self.assertRedirects(
+            response, reverse('posts:post_detail', args={self.post.id})
+        )
+        self.assertEqual(
+            Comment.objects.filter(post=self.post).count(),
+            comments_count
+        )
+
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, PAGE_CACHE_ENABLED=False)
 class PostsImagesTest(TestCase):
     @classmethod
     def setUpClass(cls):
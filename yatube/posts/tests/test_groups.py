@@ -0,0 +1,120 @@
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Group, GroupAuthorStats, GroupStats, Post
+
+User = get_user_model()
+
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class GroupStatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Первая группа', slug='first', description='Описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Вторая группа', slug='second', description='Описание'
+        )
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self, group):
+        return GroupStats.objects.get(group=group)
+
+    def test_stats_follow_posts(self):
+        """Сводка группы меняется при создании, переносе и удалении
+        постов
+        """
+        first = Post.objects.create(
+            author=self.author, group=self.group, text='Пост'
+        )
+        Post.objects.create(author=self.author, group=self.group, text='Пост')
+        last = Post.objects.create(
+            author=self.reader, group=self.group, text='Пост'
+        )
+        stats = self.stats(self.group)
+        self.assertEqual(stats.post_count, 3)
+        self.assertEqual(stats.last_post_at, last.pub_date)
+        self.assertEqual(
+            stats.top_author_counts(),
+            [(self.author.pk, 2), (self.reader.pk, 1)]
+        )
+        last.group = self.other_group
+        last.save()
+        stats = self.stats(self.group)
+        self.assertEqual(stats.post_count, 2)
+        self.assertEqual(stats.top_author_counts(), [(self.author.pk, 2)])
+        self.assertEqual(self.stats(self.other_group).post_count, 1)
+        last.delete()
+        other = self.stats(self.other_group)
+        self.assertEqual((other.post_count, other.last_post_at), (0, None))
+        self.assertFalse(GroupAuthorStats.objects.filter(
+            group=self.other_group
+        ).exists())
+        self.assertNotEqual(self.stats(self.group).last_post_at, None)
+        first.delete()
+        self.assertEqual(self.stats(self.group).post_count, 1)
+
+    def test_recount(self):
+        """recount_counters пересобирает сводки групп"""
+        Post.objects.create(author=self.author, group=self.group, text='Пост')
+        GroupStats.objects.all().delete()
+        GroupAuthorStats.objects.all().delete()
+        call_command('recount_counters', stdout=StringIO())
+        stats = self.stats(self.group)
+        self.assertEqual(stats.post_count, 1)
+        self.assertEqual(stats.top_author_counts(), [(self.author.pk, 1)])
+        self.assertEqual(self.stats(self.other_group).post_count, 0)
+
+    def test_directory_page(self):
+        """Каталог выводит группы по числу постов с активными авторами"""
+        Post.objects.create(
+            author=self.author, group=self.other_group, text='Пост'
+        )
+        response = self.client.get(reverse('posts:group_index'))
+        groups = [stats.group for stats in response.context['page_obj']]
+        self.assertEqual(groups, [self.other_group, self.group])
+        self.assertEqual([
+            (author.username, count)
+            for author, count in response.context['page_obj'][0].authors
+        ], [(self.author.username, 1)])
+        self.assertContains(
+            response, reverse('posts:group_list', args=('second',))
+        )
+
+    def test_directory_queries_do_not_grow(self):
+        """Запросы каталога не зависят от числа групп и авторов"""
+        for number in range(5):
+            group = Group.objects.create(
+                title=f'Группа {number}', slug=f'group-{number}',
+                description=''
+            )
+            author = User.objects.create_user(username=f'user{number}')
+            Post.objects.create(author=author, group=group, text='Пост')
+        with self.assertNumQueries(3):
+            self.client.get(reverse('posts:group_index'))
+
+    def test_last_post_keeps_latest_date(self):
+        """Пост с более ранней датой не сдвигает дату последнего поста"""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост'
+        )
+        old = Post(author=self.author, group=self.other_group, text='Старый')
+        old.save()
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=datetime(2000, 1, 1, tzinfo=timezone.utc)
+        )
+        old.refresh_from_db()
+        old.group = self.group
+        old.save()
+        self.assertEqual(self.stats(self.group).last_post_at, post.pub_date)
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Post
+from ..thumbnails import generate
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    THUMBNAIL_ROOT=os.path.join(TEMP_MEDIA_ROOT, 'thumbnails')
+)
+class ImageMetadataTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='tester')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_post(self, name='small.gif'):
+        self.authorized_client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        })
+        return Post.objects.get(author=self.user)
+
+    def test_metadata_on_upload(self):
+        """Форма сохраняет размеры, размер файла, хеш и заглушку"""
+        post = self.create_post()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(SMALL_GIF))
+        self.assertEqual(
+            post.image_hash, hashlib.sha256(SMALL_GIF).hexdigest()
+        )
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+
+    def test_metadata_cleared(self):
+        """Удаление картинки очищает ее сведения"""
+        post = self.create_post()
+        self.authorized_client.post(
+            reverse('posts:post_edit', args=(post.id,)),
+            {'text': post.text, 'image-clear': 'on'}
+        )
+        post.refresh_from_db()
+        self.assertFalse(post.image)
+        self.assertIsNone(post.image_size)
+        self.assertEqual(post.image_placeholder, '')
+
+    def test_render_without_files(self):
+        """Лента выводит размеры и заглушку, не открывая файлы"""
+        post = self.create_post()
+        generate(post.pk, post.image.name)
+        with mock.patch.object(
+            FileSystemStorage, 'open', side_effect=AssertionError
+        ):
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'width="320" height="113"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, post.image_placeholder)
+
+    def test_backfill(self):
+        """Команда заполняет сведения старых постов"""
+        post = Post.objects.create(
+            author=self.user, text='Старый пост',
+            image=SimpleUploadedFile('old.gif', SMALL_GIF, 'image/gif')
+        )
+        self.assertIsNone(post.image_width)
+        call_command('backfill_images', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(SMALL_GIF))
+        self.assertNotEqual(post.image_placeholder, '')
+
+    def test_backfill_variants(self):
+        """С --variants команда создает варианты старых картинок"""
+        post = Post.objects.create(
+            author=self.user, text='Старый пост',
+            image=SimpleUploadedFile('old.gif', SMALL_GIF, 'image/gif')
+        )
+        call_command('backfill_images', '--variants', stdout=StringIO())
+        self.assertTrue(post.image_variants.filter(format='jpeg').exists())
@@ -0,0 +1,37 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from ..models import Comment, Post
+
+
+class FeedIndexesTest(TestCase):
+
+    def test_feed_indexes_exist(self):
+        """Составные индексы лент созданы миграцией"""
+        for model in (Post, Comment):
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(
+                    cursor, model._meta.db_table
+                )
+            for index in model._meta.indexes:
+                with self.subTest(index=index.name):
+                    self.assertIn(index.name, constraints)
+
+    def test_explain_feeds_reports_both_runs(self):
+        """explain_feeds показывает замеры без индексов и с ними"""
+        out = StringIO()
+        call_command('explain_feeds', seed=300, repeat=1, stdout=out)
+        output = out.getvalue()
+        self.assertIn('Без индексов', output)
+        self.assertIn('С индексами', output)
+        self.assertIn('post_author_pub_date', output)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Post._meta.db_table
+            )
+        self.assertIn('post_author_pub_date', constraints)
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Comment.objects.exists())
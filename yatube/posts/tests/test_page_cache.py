@@ -0,0 +1,136 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post
+from ..page_cache import BYPASS_COOKIE
+
+User = get_user_model()
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Текст поста')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_anonymous_page_cached(self):
+        """Повторная страница для анонима отдается без запросов к базе"""
+        address = reverse('posts:index')
+        self.client.get(address)
+        with self.assertNumQueries(0):
+            response = self.client.get(address)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Текст поста')
+        self.assertNotContains(response, '<!--hole')
+
+    def test_signals_invalidate_pages(self):
+        """Изменение данных сразу сбрасывает сохраненные страницы"""
+        addresses = [
+            reverse('posts:index'),
+            reverse('posts:post_detail', args=(self.post.id,)),
+            reverse('posts:profile', args=('author',)),
+        ]
+        for address in addresses:
+            self.client.get(address)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        for address in addresses:
+            with self.subTest(address=address):
+                response = self.client.get(address)
+                self.assertFalse(response.has_header('X-Page-Cache'))
+                self.assertContains(response, 'Новый текст')
+
+    def test_user_parts_filled_in(self):
+        """Вошедший пользователь получает сохраненную страницу со своими
+        меню, формой комментария и CSRF-токеном
+        """
+        address = reverse('posts:post_detail', args=(self.post.id,))
+        anonymous = self.client.get(address)
+        self.assertNotContains(anonymous, 'Добавить комментарий')
+        response = self.reader_client.get(address)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertContains(response, 'Добавить комментарий')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertNotContains(response, 'Редактировать запись')
+        self.assertIn('csrftoken', response.cookies)
+
+    def test_follow_button_per_user(self):
+        """Кнопка подписки соответствует посетителю"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        address = reverse('posts:profile', args=('author',))
+        self.assertContains(self.client.get(address), 'Подписаться')
+        response = self.reader_client.get(address)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Отписаться')
+
+    def test_user_pages_not_stored(self):
+        """Страница, построенная для пользователя, не сохраняется"""
+        address = reverse('posts:index')
+        self.reader_client.get(address)
+        response = self.client.get(address)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertNotContains(response, 'Пользователь: reader')
+
+    def test_bypass_after_write(self):
+        """После изменяющего запроса посетитель получает страницы мимо
+        кеша
+        """
+        address = reverse('posts:post_detail', args=(self.post.id,))
+        self.client.get(address)
+        response = self.reader_client.post(
+            reverse('posts:add_comment', args=(self.post.id,)),
+            {'text': 'Комментарий'}
+        )
+        self.assertIn(BYPASS_COOKIE, response.cookies)
+        response = self.reader_client.get(address)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+
+    def test_about_pages_cached(self):
+        """Статические страницы тоже сохраняются"""
+        address = reverse('about:author')
+        self.client.get(address)
+        response = self.client.get(address)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+
+    def test_hit_keeps_validators(self):
+        """Сохраненная страница отдается с ETag и Last-Modified
+        представления и отвечает 304 на условный запрос
+        """
+        address = reverse('posts:index')
+        miss = self.client.get(address)
+        hit = self.client.get(address)
+        self.assertEqual(hit['X-Page-Cache'], 'hit')
+        self.assertEqual(hit['ETag'], miss['ETag'])
+        self.assertEqual(hit['Last-Modified'], miss['Last-Modified'])
+        response = self.client.get(
+            address, HTTP_IF_NONE_MATCH=miss['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        response = self.client.get(
+            address, HTTP_IF_MODIFIED_SINCE=miss['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_hit_etag_per_user(self):
+        """Вошедший пользователь не получает 304 по ETag анонима"""
+        address = reverse('posts:index')
+        anonymous = self.client.get(address)
+        response = self.reader_client.get(
+            address, HTTP_IF_NONE_MATCH=anonymous['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+        self.assertFalse(response.has_header('Last-Modified'))
@@ -1,13 +1,18 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from ..models import Group, Post
+from ..utils import ElidedPaginator, approximate_count
 
 User = get_user_model()
 
 
+@override_settings(PAGE_CACHE_ENABLED=False)
 class PaginatorViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -61,3 +66,107 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len(response.context['page_obj']),
                                  posts_in_sec_page
                                  )
+
+    def test_cursor_pages_cover_all_posts(self):
+        """Курсорная навигация проходит все посты без повторов"""
+        response = self.client.get(reverse('posts:index'))
+        first_page = response.context['page_obj']
+        self.assertIsNone(first_page.previous_cursor)
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': first_page.next_cursor}
+        )
+        second_page = response.context['page_obj']
+        self.assertIsNone(second_page.next_cursor)
+        ids = [post.id for post in list(first_page) + list(second_page)]
+        self.assertEqual(
+            ids,
+            list(Post.objects.order_by('-pub_date', '-id')
+                 .values_list('id', flat=True))
+        )
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': second_page.previous_cursor}
+        )
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            [post.id for post in first_page]
+        )
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор ведет на первую страницу"""
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'broken'}
+        )
+        self.assertEqual(len(response.context['page_obj']),
+                         settings.POST_PER_PAGE)
+        self.assertIsNone(response.context['page_obj'].previous_cursor)
+
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class ElidedPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='tester')
+        for _ in range(13):
+            Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_elided_range(self):
+        """Далекие от текущей страницы номера заменяются многоточием"""
+        paginator = ElidedPaginator(range(1000), 10)
+        self.assertEqual(
+            list(paginator.get_elided_page_range(50)),
+            [1, '…', 48, 49, 50, 51, 52, '…', 100]
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(2)),
+            [1, 2, 3, 4, '…', 100]
+        )
+        self.assertEqual(
+            list(ElidedPaginator(range(50), 10).get_elided_page_range(3)),
+            [1, 2, 3, 4, 5]
+        )
+
+    def test_counter_replaces_count(self):
+        """Переданное число записей заменяет COUNT(*)"""
+        paginator = ElidedPaginator(Post.objects.all(), 10, lambda: 95)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.num_pages, 10)
+
+    @override_settings(POST_PER_PAGE=1)
+    def test_page_links_bounded(self):
+        """Число ссылок на страницы не зависит от числа постов"""
+        response = self.client.get(reverse('posts:index'), {'page': 7})
+        self.assertEqual(
+            response.content.decode().count('class="page-link"'), 13
+        )
+        self.assertContains(response, '…', count=2)
+
+    def test_index_count_cached(self):
+        """Число постов ленты считается один раз до нового поста"""
+        address = reverse('posts:index')
+        self.client.get(address, {'page': 2})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(address, {'page': 1})
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries)
+        )
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = self.client.get(address, {'page': 1})
+        self.assertEqual(response.context['page_obj'].paginator.count, 14)
+
+    @override_settings(PAGINATOR_EXACT_COUNT_LIMIT=5)
+    def test_large_table_estimated(self):
+        """Большая таблица считается по статистике ANALYZE"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        Post.objects.create(text='Новый пост', author=self.user)
+        self.assertEqual(
+            approximate_count('index', Post.objects.for_feed()), 13
+        )
+        self.assertEqual(
+            approximate_count('profile', Post.objects.filter(
+                author=self.user
+            )), 14
+        )
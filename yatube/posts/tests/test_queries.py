@@ -0,0 +1,114 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import users
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryBudgetTest(TestCase):
+    """Число запросов страницы не зависит от количества постов."""
+    # Бюджет запросов для авторизованного пользователя:
+    # сессия и пользователь плюс запросы самой страницы.
+    BUDGETS = {
+        'posts:index': 3,
+        'posts:group_list': 4,
+        'posts:profile': 5,
+        'posts:post_detail': 4,
+        'posts:follow_index': 4,
+        'posts:search': 5,
+        'posts:group_index': 5,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-group',
+            description='Описание тестовой группы'
+        )
+        cls.author = User.objects.create_user(username='author')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            text='Текст поста', author=cls.author, group=cls.group
+        )
+        cls.create_posts(1)
+
+    @classmethod
+    def create_posts(cls, count):
+        posts = []
+        for index in range(count):
+            author = User.objects.create_user(
+                username=f'user{Post.objects.count()}',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            Follow.objects.get_or_create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                text='Текст поста', author=author, group=cls.group
+            )
+            Post.objects.create(
+                text='Текст поста', author=cls.author, group=cls.group
+            )
+            Comment.objects.create(post=cls.post, author=author, text='Ок')
+            posts.append(post)
+        return posts
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def address(self, name):
+        args = {
+            'posts:group_list': (self.group.slug,),
+            'posts:profile': (self.author.username,),
+            'posts:post_detail': (self.post.id,),
+        }.get(name, ())
+        if name == 'posts:search':
+            return reverse(name) + '?q=текст'
+        return reverse(name, args=args)
+
+    def count_queries(self, name, warm_users=True):
+        cache.clear()
+        users.local.clear()
+        # Словарь пользователей живет сутки и обычно уже заполнен.
+        if warm_users:
+            users.by_id(User.objects.values_list('id', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.address(name))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_budget(self):
+        """Страницы укладываются в бюджет запросов"""
+        for name, budget in self.BUDGETS.items():
+            with self.subTest(name=name):
+                self.assertLessEqual(self.count_queries(name), budget)
+
+    def test_cold_user_cache(self):
+        """Пустой словарь пользователей стоит одного запроса"""
+        for name, budget in self.BUDGETS.items():
+            with self.subTest(name=name):
+                self.assertLessEqual(
+                    self.count_queries(name, warm_users=False), budget + 1
+                )
+
+    def test_queries_do_not_grow_with_posts(self):
+        """Число запросов не растет вместе с числом постов и авторов"""
+        before = {
+            name: self.count_queries(name, warm_users=False)
+            for name in self.BUDGETS
+        }
+        self.create_posts(5)
+        for name in self.BUDGETS:
+            with self.subTest(name=name):
+                self.assertEqual(
+                    self.count_queries(name, warm_users=False), before[name]
+                )
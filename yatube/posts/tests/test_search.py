@@ -0,0 +1,170 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Post, SearchTerm
+from ..search import (FTS5SearchBackend, InvertedIndexSearchBackend,
+                      get_search_backend)
+
+User = get_user_model()
+
+
+class SearchTestMixin:
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(
+            author=self.author, text='Рецепт яблочного пирога'
+        )
+        self.other = Post.objects.create(
+            author=self.author, text='Прогулка по осеннему лесу'
+        )
+        Comment.objects.create(
+            post=self.other, author=self.author, text='Взяли с собой пирога'
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return list(response.context['page_obj'])
+
+    def test_backend(self):
+        """Выбран нужный движок поиска"""
+        self.assertIsInstance(get_search_backend(), self.backend)
+
+    def test_post_and_comment_found(self):
+        """Находятся посты по тексту и по комментариям,
+        совпадение в тексте поста выше
+        """
+        self.assertEqual(self.search('Пирога'), [self.post, self.other])
+
+    def test_all_words_required(self):
+        """Пост находится, только если в нем есть все слова запроса"""
+        self.assertEqual(self.search('яблочного пирога'), [self.post])
+        self.assertEqual(self.search('яблочного леса'), [])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении постов и комментариев"""
+        self.post.text = 'Рецепт грушевого пирога'
+        self.post.save()
+        self.assertEqual(self.search('яблочного'), [])
+        self.assertEqual(self.search('грушевого'), [self.post])
+        self.other.comments.all().delete()
+        self.assertEqual(self.search('пирога'), [self.post])
+        self.post.delete()
+        self.assertEqual(self.search('пирога'), [])
+
+    def test_comment_indexed_incrementally(self):
+        """Новый комментарий индексируется без чтения остальных,
+        удаление одного не теряет слова других
+        """
+        with CaptureQueriesContext(connection) as queries:
+            comment = Comment.objects.create(
+                post=self.other, author=self.author, text='Грибной суп'
+            )
+        self.assertFalse(any(
+            'FROM "posts_comment"' in query['sql']
+            for query in queries.captured_queries
+        ))
+        self.assertEqual(self.search('грибной'), [self.other])
+        self.assertEqual(self.search('пирога'), [self.post, self.other])
+        comment.delete()
+        self.assertEqual(self.search('грибной'), [])
+        self.assertEqual(self.search('пирога'), [self.post, self.other])
+
+    def test_query_syntax_ignored(self):
+        """Спецсимволы и операторы в запросе ищутся как обычные слова"""
+        for query in ('"пирога', 'пирога OR лесу', 'NEAR(пирога)', '*', ''):
+            with self.subTest(query=query):
+                self.search(query)
+
+    def test_pagination(self):
+        """Результаты делятся на страницы, ссылки сохраняют запрос"""
+        Post.objects.bulk_create(
+            Post(author=self.author, text='Много пирогов') for _ in range(12)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.client.get(reverse('posts:search'), {'q': 'пирогов'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 12)
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertContains(response, '?q=%D0%BF%D0%B8%D1%80%D0%BE%D0%B3')
+        self.assertEqual(len(self.search('пирогов', page=2)), 2)
+
+    @override_settings(SEARCH_RANK_WINDOW=1)
+    def test_rank_window(self):
+        """Ранжируются только самые новые совпадения, остальные идут
+        за ними от новых к старым
+        """
+        self.assertEqual(self.search('пирога'), [self.other, self.post])
+
+    @override_settings(SEARCH_RANK_WINDOW=3)
+    def test_matches_beyond_window(self):
+        """Совпадения за окном ранжирования считаются и доступны
+        на страницах
+        """
+        Post.objects.bulk_create(
+            Post(author=self.author, text='Много пирогов') for _ in range(12)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.client.get(reverse('posts:search'), {'q': 'пирогов'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 12)
+        found = self.search('пирогов') + self.search('пирогов', page=2)
+        self.assertEqual(
+            sorted(post.pk for post in found),
+            list(Post.objects.filter(
+                text='Много пирогов'
+            ).values_list('pk', flat=True).order_by('pk'))
+        )
+        self.assertEqual(
+            [post.pk for post in found[3:]],
+            sorted((post.pk for post in found[3:]), reverse=True)
+        )
+
+    def test_rebuild(self):
+        """Команда rebuild_search_index индексирует записи без сигналов"""
+        Post.objects.bulk_create([
+            Post(author=self.author, text='Пост без сигналов')
+        ])
+        self.assertEqual(self.search('сигналов'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search('сигналов')), 1)
+        self.assertEqual(self.search('пирога'), [self.post, self.other])
+
+
+class FTS5SearchTest(SearchTestMixin, TestCase):
+    backend = FTS5SearchBackend
+
+
+@override_settings(SEARCH_BACKEND='posts.search.InvertedIndexSearchBackend')
+class InvertedIndexSearchTest(SearchTestMixin, TestCase):
+    backend = InvertedIndexSearchBackend
+
+    def test_terms_weighted(self):
+        """Слова из комментариев весят меньше слов из текста поста"""
+        weights = dict(SearchTerm.objects.filter(
+            post=self.other
+        ).values_list('term', 'weight'))
+        self.assertEqual(weights['лесу'], 1)
+        self.assertEqual(weights['пирога'], 0.5)
+
+    def test_comment_weights_added_and_removed(self):
+        """Комментарий прибавляет и при удалении вычитает свои веса"""
+        comment = Comment.objects.create(
+            post=self.other, author=self.author, text='Пирога много'
+        )
+        weights = dict(SearchTerm.objects.filter(
+            post=self.other
+        ).values_list('term', 'weight'))
+        self.assertEqual(weights['пирога'], 1)
+        self.assertEqual(weights['много'], 0.5)
+        comment.delete()
+        weights = dict(SearchTerm.objects.filter(
+            post=self.other
+        ).values_list('term', 'weight'))
+        self.assertEqual(weights['пирога'], 0.5)
+        self.assertNotIn('много', weights)
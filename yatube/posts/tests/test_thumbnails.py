@@ -0,0 +1,219 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import ImageVariant, Post
+from ..thumbnails import (
+    FAILED, FORMATS, available_formats, generate, mark_failed, worker
+)
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    THUMBNAIL_ROOT=os.path.join(TEMP_MEDIA_ROOT, 'thumbnails')
+)
+class ThumbnailPlaceholderTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tester')
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('placeholder.gif', SMALL_GIF)
+        )
+
+    def test_placeholder_until_ready(self):
+        """Пока миниатюра не готова, выводится заглушка"""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+        self.assertNotContains(response, '<img class="card-img')
+
+    def test_placeholder_not_cached(self):
+        """Фрагмент с заглушкой не попадает в кеш"""
+        self.client.get(reverse('posts:index'))
+        generate(self.post.pk, self.post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<img class="card-img')
+
+    def test_variants_of_old_image_ignored(self):
+        """Варианты замененной картинки не выводятся"""
+        ImageVariant.objects.create(
+            post=self.post, source='posts/old.gif', format='jpeg',
+            width=320, height=113, name='posts/old-320.jpg'
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'old-320.jpg')
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+
+    def test_failed_image_shown_as_is(self):
+        """Картинка, которую не удалось обработать, выводится как есть,
+        и страница получает ETag
+        """
+        mark_failed(self.post.pk, self.post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, f'src="{self.post.image.url}"')
+        self.assertNotContains(response, 'aspect-ratio: 960 / 339')
+        self.assertTrue(response.has_header('ETag'))
+
+
+def png(width, height):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), (200, 30, 30)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    THUMBNAIL_ROOT=os.path.join(TEMP_MEDIA_ROOT, 'thumbnails')
+)
+class ImageVariantTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tester')
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('wide.png', png(1000, 500))
+        )
+
+    def test_widths_and_formats(self):
+        """Создаются ширины не больше исходной во всех доступных
+        форматах, обрезанные до общих пропорций
+        """
+        generate(self.post.pk, self.post.image.name)
+        variants = ImageVariant.objects.filter(post=self.post)
+        formats = available_formats()
+        self.assertIn('jpeg', formats)
+        self.assertEqual(
+            sorted({(variant.width, variant.height) for variant in variants}),
+            [(320, 113), (640, 226), (960, 339)]
+        )
+        self.assertEqual(variants.count(), 3 * len(formats))
+        for name in formats:
+            with self.subTest(format=name):
+                self.assertIn(FORMATS[name][0], Image.SAVE)
+
+    def test_retry_clears_failed_mark(self):
+        """Успешная повторная обработка снимает отметку о сбое"""
+        mark_failed(self.post.pk, self.post.image.name)
+        call_command('backfill_images', '--variants', stdout=StringIO())
+        formats = set(
+            self.post.image_variants.values_list('format', flat=True)
+        )
+        self.assertIn('jpeg', formats)
+        self.assertNotIn(FAILED, formats)
+
+    def test_regenerate_replaces(self):
+        """Повторная обработка заменяет записи и файлы вариантов"""
+        generate(self.post.pk, self.post.image.name)
+        old = list(ImageVariant.objects.values_list('name', flat=True))
+        generate(self.post.pk, self.post.image.name)
+        self.assertEqual(ImageVariant.objects.count(), len(old))
+        thumbnail_root = settings.THUMBNAIL_ROOT
+        for name in old:
+            if not ImageVariant.objects.filter(name=name).exists():
+                self.assertFalse(
+                    os.path.exists(os.path.join(thumbnail_root, name))
+                )
+
+    def test_picture_markup(self):
+        """Тег выводит <picture> со srcset из записей вариантов"""
+        for width, height in ((320, 113), (960, 339)):
+            for name in ('webp', 'jpeg'):
+                ImageVariant.objects.create(
+                    post=self.post, source=self.post.image.name,
+                    format=name, width=width, height=height,
+                    name=f'posts/wide-{width}.{FORMATS[name][1]}'
+                )
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        url = settings.THUMBNAIL_URL
+        self.assertContains(
+            response,
+            f'<source type="image/webp" srcset="{url}posts/wide-320.webp '
+            f'320w, {url}posts/wide-960.webp 960w"'
+        )
+        self.assertContains(response, f'src="{url}posts/wide-960.jpg"')
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'loading="lazy"')
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    THUMBNAIL_ROOT=os.path.join(TEMP_MEDIA_ROOT, 'thumbnails')
+)
+class ThumbnailWorkerTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='uploader')
+        self.client.force_login(self.user)
+
+    def test_uploaded_image_pregenerated(self):
+        """Загруженная картинка обрабатывается фоновым потоком"""
+        processed = worker.stats()['processed']
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Новый пост',
+            'image': SimpleUploadedFile('upload.gif', SMALL_GIF),
+        })
+        worker.join()
+        post = Post.objects.get()
+        self.assertTrue(
+            post.image_variants.filter(
+                source=post.image.name, format='jpeg'
+            ).exists()
+        )
+        stats = worker.stats()
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['processed'], processed + 1)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<img class="card-img')
+
+    def test_failed_image_marked(self):
+        """Сбой обработки записывается, и картинка не ставится в очередь
+        снова
+        """
+        post = Post.objects.create(
+            text='Пост без файла', author=self.user, image='posts/lost.gif'
+        )
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            worker.enqueue(post.pk, post.image.name)
+            worker.join()
+        self.assertTrue(
+            post.image_variants.filter(
+                source=post.image.name, format=FAILED
+            ).exists()
+        )
+        pending = worker.stats()['queue_depth']
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(worker.stats()['queue_depth'], pending)
+        self.assertEqual(worker.pending, set())
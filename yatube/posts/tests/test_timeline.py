@@ -0,0 +1,110 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry
+from ..timeline import get_timeline_store
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.follower = User.objects.create_user(username='follower')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        self.client.force_login(self.follower)
+
+    def feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return [post.id for post in response.context['page_obj']]
+
+    def test_new_post_fanned_out_to_followers(self):
+        """Новый пост попадает в материализованную ленту подписчика"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower, post=post
+        ).exists())
+        self.assertEqual(self.feed(), [post.id])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка заполняет ленту старыми постами, отписка очищает"""
+        posts = [
+            Post.objects.create(author=self.author, text='Пост')
+            for _ in range(3)
+        ]
+        self.client.get(reverse(
+            'posts:profile_follow', args=(self.author.username,)
+        ))
+        expected = [post.id for post in reversed(posts)]
+        self.assertEqual(self.feed(), expected)
+        paginator = get_timeline_store().paginator(self.follower, 2)
+        page = paginator.cursor_page()
+        paged = [post.id for post in page]
+        while page.next_cursor:
+            page = paginator.cursor_page(page.next_cursor)
+            paged += [post.id for post in page]
+        self.assertEqual(paged, expected)
+        self.client.get(reverse(
+            'posts:profile_unfollow', args=(self.author.username,)
+        ))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower).exists()
+        )
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_merged_on_read(self):
+        """Посты популярного автора подмешиваются при чтении"""
+        regular = User.objects.create_user(username='regular')
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        Follow.objects.create(user=self.follower, author=regular)
+        first = Post.objects.create(author=self.author, text='Первый')
+        second = Post.objects.create(author=regular, text='Второй')
+        third = Post.objects.create(author=self.author, text='Третий')
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('post_id', flat=True)),
+            [second.id]
+        )
+        self.assertEqual(self.feed(), [third.id, second.id, first.id])
+
+    @override_settings(TIMELINE_BACKFILL_LIMIT=2)
+    def test_follow_backfills_recent_posts(self):
+        """Подписка раскладывает только последние посты автора,
+        а более старые подмешиваются при чтении
+        """
+        regular = User.objects.create_user(username='regular')
+        Follow.objects.create(user=self.follower, author=regular)
+        posts = [
+            Post.objects.create(author=author, text='Пост')
+            for _ in range(3)
+            for author in (self.author, regular)
+        ]
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user=self.follower, author=self.author
+            ).count(),
+            2
+        )
+        self.assertEqual(
+            Follow.objects.get(
+                user=self.follower, author=self.author
+            ).timeline_since,
+            posts[2].pub_date
+        )
+        expected = [post.id for post in reversed(posts)]
+        self.assertEqual(self.feed(), expected)
+        paginator = get_timeline_store().paginator(self.follower, 2)
+        page = paginator.cursor_page()
+        paged = [post.id for post in page]
+        while page.next_cursor:
+            page = paginator.cursor_page(page.next_cursor)
+            paged += [post.id for post in page]
+        self.assertEqual(paged, expected)
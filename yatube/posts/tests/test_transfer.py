@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import transfer
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserStats
+from ..search import SearchResults, get_search_backend, tokenize
+
+User = get_user_model()
+PUB_DATE = datetime(2020, 5, 17, 12, 30, tzinfo=timezone.utc)
+
+
+class InterruptedImporter(transfer.Importer):
+    """Импорт, который обрывается на второй пачке комментариев."""
+
+    def load_comments(self, rows):
+        if self.loaded['comments']:
+            raise RuntimeError('Обрыв')
+        super().load_comments(rows)
+
+
+class CheckpointLostImporter(transfer.Importer):
+    """Импорт, который обрывается после фиксации первой пачки
+    комментариев, но до записи контрольной точки.
+    """
+
+    def save_state(self):
+        if self.loaded['comments'] and not self.state['pending']:
+            raise RuntimeError('Обрыв')
+        super().save_state()
+
+
+class TransferTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        post = Post.objects.create(
+            author=author, group=group, text='Пост про пирог'
+        )
+        Post.objects.filter(pk=post.pk).update(pub_date=PUB_DATE)
+        Post.objects.create(author=reader, text='Пост без группы')
+        for number in range(3):
+            Comment.objects.create(
+                post=post, author=reader, text=f'Комментарий {number}'
+            )
+        Follow.objects.create(user=reader, author=author)
+
+    def export_and_clear(self, fmt):
+        call_command(
+            'export_data', self.directory, format=fmt, stdout=StringIO()
+        )
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        User.objects.all().delete()
+
+    def assert_restored(self):
+        post = Post.objects.select_related('author', 'group').get(
+            text='Пост про пирог'
+        )
+        self.assertEqual(post.author.username, 'author')
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.pub_date, PUB_DATE)
+        self.assertEqual(post.comment_count, 3)
+        self.assertEqual(Comment.objects.filter(post=post).count(), 3)
+        self.assertEqual(Post.objects.count(), 2)
+        stats = UserStats.objects.get(user__username='author')
+        self.assertEqual((stats.post_count, stats.follower_count), (1, 1))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user__username='reader', post=post
+        ).exists())
+        results = SearchResults(get_search_backend(), tokenize('пирог'))
+        self.assertEqual(list(results), [post])
+        self.assertFalse(os.path.exists(
+            os.path.join(self.directory, transfer.CHECKPOINT)
+        ))
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка в обоих форматах сохраняют данные
+        и заново строят счетчики, ленты и поиск
+        """
+        for fmt in transfer.FORMATS:
+            with self.subTest(format=fmt):
+                self.export_and_clear(fmt)
+                call_command(
+                    'import_data', self.directory, format=fmt,
+                    stdout=StringIO()
+                )
+                self.assert_restored()
+
+    def test_resume(self):
+        """Прерванный импорт продолжается без повторной загрузки строк"""
+        self.export_and_clear('ndjson')
+        with self.assertRaises(RuntimeError):
+            InterruptedImporter(self.directory, 'ndjson', batch_size=2).run()
+        self.assertEqual(Comment.objects.count(), 2)
+        call_command(
+            'import_data', self.directory, resume=True, batch_size=2,
+            stdout=StringIO()
+        )
+        self.assert_restored()
+
+    def test_resume_after_lost_checkpoint(self):
+        """Пачка, зафиксированная без контрольной точки, не вставляется
+        повторно
+        """
+        self.export_and_clear('ndjson')
+        with self.assertRaises(RuntimeError):
+            CheckpointLostImporter(
+                self.directory, 'ndjson', batch_size=2
+            ).run()
+        self.assertEqual(Comment.objects.count(), 2)
+        call_command(
+            'import_data', self.directory, resume=True, batch_size=2,
+            stdout=StringIO()
+        )
+        self.assert_restored()
+
+    def test_empty_import(self):
+        """Пустой каталог и пустой файл загружаются без ошибок"""
+        transfer.Importer(self.directory, 'ndjson').run()
+        open(os.path.join(self.directory, 'groups.ndjson'), 'w').close()
+        self.assertEqual(
+            transfer.Importer(self.directory, 'ndjson').run()['groups'], 0
+        )
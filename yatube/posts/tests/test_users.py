@@ -0,0 +1,86 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import users
+
+User = get_user_model()
+
+
+class LRUCacheTest(TestCase):
+    def test_evicts_least_recent(self):
+        """Переполненный словарь вытесняет давно не читавшийся ключ"""
+        lru = users.LRUCache(size=2, timeout=60)
+        lru.set_many({'a': 1, 'b': 2})
+        lru.get_many(['a'])
+        lru.set_many({'c': 3})
+        self.assertEqual(lru.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+
+    def test_expires(self):
+        """Записи процесса живут не дольше timeout"""
+        lru = users.LRUCache(size=2, timeout=60)
+        with mock.patch.object(users.time, 'monotonic', return_value=0):
+            lru.set_many({'a': 1})
+        with mock.patch.object(users.time, 'monotonic', return_value=61):
+            self.assertEqual(lru.get_many(['a']), {})
+
+
+class UserCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lookup_cached(self):
+        """Повторный поиск не обращается к базе"""
+        users.by_username(['author'])
+        with self.assertNumQueries(0):
+            ref = users.by_id([self.author.pk])[self.author.pk]
+        self.assertEqual(ref.name, 'Лев Толстой')
+
+    def test_change_forgotten(self):
+        """Изменение имени сбрасывает записи пользователя"""
+        users.by_id([self.author.pk])
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'leo'
+        author.first_name = 'Лео'
+        author.save()
+        self.assertEqual(users.by_username(['author']), {})
+        self.assertEqual(
+            users.by_id([self.author.pk])[self.author.pk].name, 'Лео Толстой'
+        )
+
+    def test_delete_forgotten(self):
+        """Удаленный пользователь пропадает из словаря"""
+        users.by_username(['author'])
+        User.objects.get(pk=self.author.pk).delete()
+        self.assertEqual(users.by_username(['author']), {})
+
+    def test_author_link(self):
+        """Ссылка на автора строится без запроса к auth_user"""
+        users.by_id([self.author.pk])
+        template = Template(
+            '{% load authors %}{% author_link user_id %}'
+        )
+        with self.assertNumQueries(0):
+            html = template.render(Context({'user_id': self.author.pk}))
+        self.assertEqual(
+            html,
+            f'<a href="{reverse("posts:profile", args=("author",))}">'
+            f'Лев Толстой</a>'
+        )
+
+    def test_unknown_profile(self):
+        """Профиль неизвестного пользователя возвращает 404"""
+        response = self.client.get(
+            reverse('posts:profile', args=('nobody',))
+        )
+        self.assertEqual(response.status_code, 404)
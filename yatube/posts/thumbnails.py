@@ -0,0 +1,259 @@
+"""Фоновая подготовка вариантов картинок постов.
+
+post_create и post_edit ставят картинку в очередь, рабочие потоки
+обрезают ее до пропорций POST_IMAGE_ASPECT, сохраняют несколько ширин
+в каждом формате, который умеет записывать Pillow (AVIF, WebP, JPEG),
+и записывают их в таблицу ImageVariant. Шаблоны строят <picture>
+и srcset из этих записей, загруженных вместе с постами, и не обращаются
+ни к файлам, ни к кешу. Картинку, которую не удалось обработать,
+отмечает запись формата FAILED, и шаблоны выводят ее как есть.
+Очередь в памяти процесса заменяет внешний брокер задач. Файлы
+вариантов хранятся в отдельном THUMBNAIL_ROOT.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import close_old_connections, transaction
+from django.utils.functional import cached_property
+from PIL import Image, ImageOps
+
+from . import cache as versions
+from .models import ImageVariant, Post
+
+try:
+    # AVIF в Pillow добавляет необязательный модуль pillow-avif-plugin.
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+# Формат варианта: имя кодека Pillow, расширение файла и MIME-тип.
+FORMATS = {
+    'avif': ('AVIF', 'avif', 'image/avif'),
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+}
+# Отметка о сбое: запись ImageVariant без файла.
+FAILED = 'failed'
+
+
+def available_formats():
+    """Форматы POST_IMAGE_FORMATS, которые умеет сохранять Pillow."""
+    Image.init()
+    return [
+        name for name in settings.POST_IMAGE_FORMATS
+        if FORMATS[name][0] in Image.SAVE
+    ]
+
+
+def variant_widths(width):
+    """Ширины вариантов не больше исходной; крошечная картинка
+    растягивается до наименьшей ширины.
+    """
+    widths = [size for size in settings.POST_IMAGE_WIDTHS if size <= width]
+    return widths or [min(settings.POST_IMAGE_WIDTHS)]
+
+
+def crop_to_aspect(picture):
+    """Обрезает картинку по центру до пропорций POST_IMAGE_ASPECT."""
+    aspect_width, aspect_height = settings.POST_IMAGE_ASPECT
+    width, height = picture.size
+    if width * aspect_height > height * aspect_width:
+        new_width = height * aspect_width // aspect_height
+        left = (width - new_width) // 2
+        return picture.crop((left, 0, left + new_width, height))
+    new_height = width * aspect_height // aspect_width
+    top = (height - new_height) // 2
+    return picture.crop((0, top, width, top + new_height))
+
+
+def encode(picture, name):
+    codec = FORMATS[name][0]
+    if picture.mode not in ('RGB', 'RGBA') or codec == 'JPEG':
+        picture = picture.convert('RGB')
+    buffer = BytesIO()
+    picture.save(buffer, codec, quality=settings.POST_IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def generate(post_id, name):
+    """Создает варианты картинки поста и записывает их в ImageVariant."""
+    aspect_width, aspect_height = settings.POST_IMAGE_ASPECT
+    stem = os.path.splitext(os.path.basename(name))[0]
+    formats = available_formats()
+    variants = []
+    with default_storage.open(name) as file, Image.open(file) as picture:
+        picture = crop_to_aspect(ImageOps.exif_transpose(picture))
+        for width in variant_widths(picture.width):
+            height = round(width * aspect_height / aspect_width)
+            resized = picture.resize((width, height), Image.LANCZOS)
+            for format_name in formats:
+                extension = FORMATS[format_name][1]
+                path = variant_storage.save(
+                    f'posts/{post_id}/{stem}-{width}.{extension}',
+                    ContentFile(encode(resized, format_name))
+                )
+                variants.append(ImageVariant(
+                    post_id=post_id, source=name, format=format_name,
+                    width=width, height=height, name=path
+                ))
+    with transaction.atomic():
+        stale = ImageVariant.objects.filter(post_id=post_id)
+        stale_names = list(
+            stale.exclude(format=FAILED).values_list('name', flat=True)
+        )
+        stale.delete()
+        if Post.objects.filter(pk=post_id, image=name).exists():
+            ImageVariant.objects.bulk_create(variants)
+        else:
+            stale_names += [variant.name for variant in variants]
+    for path in stale_names:
+        variant_storage.delete(path)
+    versions.bump(f'card:{post_id}', f'post:{post_id}')
+
+
+def mark_failed(post_id, name):
+    """Отмечает картинку, для которой не удалось создать варианты.
+
+    Отметка загружается вместе с вариантами поста: шаблоны выводят
+    картинку как есть и не ставят ее в очередь снова. Повторить
+    обработку можно командой backfill_images, успешный generate
+    удаляет отметку вместе с остальными записями.
+    """
+    if not Post.objects.filter(pk=post_id, image=name).exists():
+        return
+    ImageVariant.objects.bulk_create([ImageVariant(
+        post_id=post_id, source=name, format=FAILED,
+        width=0, height=0, name=''
+    )], ignore_conflicts=True)
+    versions.bump(f'card:{post_id}', f'post:{post_id}')
+
+
+class ThumbnailStorage(FileSystemStorage):
+    """Файлы вариантов в THUMBNAIL_ROOT, отдельно от загрузок.
+
+    Производные файлы можно удалить или вынести на другой диск,
+    не трогая MEDIA_ROOT.
+    """
+
+    @cached_property
+    def base_location(self):
+        return settings.THUMBNAIL_ROOT
+
+    @cached_property
+    def base_url(self):
+        return settings.THUMBNAIL_URL
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting == 'THUMBNAIL_ROOT':
+            self.__dict__.pop('base_location', None)
+            self.__dict__.pop('location', None)
+        elif setting == 'THUMBNAIL_URL':
+            self.__dict__.pop('base_url', None)
+
+
+class ThumbnailWorker:
+    """Пул потоков, обрабатывающий очередь картинок."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.threads = []
+        self.processed = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def enqueue(self, post_id, name):
+        job = (post_id, name)
+        with self.lock:
+            if job in self.pending:
+                return
+            self.pending.add(job)
+            if not self.threads:
+                self._start()
+        self.queue.put((job, time.monotonic()))
+
+    def _start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(
+                target=self._run,
+                name=f'thumbnail-worker-{number}',
+                daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def _run(self):
+        while True:
+            job, queued_at = self.queue.get()
+            try:
+                self._process(*job)
+            finally:
+                self._done(job, time.monotonic() - queued_at)
+                self.queue.task_done()
+
+    def _process(self, post_id, name):
+        # Любая ошибка не должна останавливать рабочий поток.
+        try:
+            generate(post_id, name)
+        except Exception:
+            logger.exception('Не удалось создать варианты %s', name)
+            with self.lock:
+                self.failed += 1
+            try:
+                mark_failed(post_id, name)
+            except Exception:
+                logger.exception('Не удалось отметить сбой %s', name)
+        finally:
+            close_old_connections()
+
+    def _done(self, job, latency):
+        with self.lock:
+            self.pending.discard(job)
+            self.processed += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+        logger.info(
+            'Варианты %s готовы за %.3f с, в очереди %d',
+            job[1], latency, self.queue.qsize()
+        )
+
+    def join(self):
+        """Ждет обработки всей очереди."""
+        self.queue.join()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'queue_depth': self.queue.qsize(),
+                'processed': self.processed,
+                'failed': self.failed,
+                'avg_latency': (
+                    self.total_latency / self.processed
+                    if self.processed else 0.0
+                ),
+                'max_latency': self.max_latency,
+            }
+
+
+variant_storage = ThumbnailStorage()
+worker = ThumbnailWorker(settings.THUMBNAIL_WORKERS)
+
+
+def schedule(post):
+    """Ставит картинку поста в очередь после фиксации транзакции."""
+    if post.image:
+        post_id, name = post.pk, post.image.name
+        transaction.on_commit(lambda: worker.enqueue(post_id, name))
@@ -0,0 +1,203 @@
+"""Лента подписок, материализованная при записи (fan-out-on-write).
+
+При публикации пост раскладывается в TimelineEntry каждого подписчика,
+и чтение страницы ленты становится одним проходом по индексу
+(user, -pub_date, -post). Посты авторов, у которых подписчиков больше
+TIMELINE_FANOUT_LIMIT, не раскладываются, а подмешиваются при чтении.
+Подписка раскладывает только TIMELINE_BACKFILL_LIMIT последних постов
+автора, а более старые тоже подмешиваются при чтении.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .utils import CursorPaginator
+
+BATCH_SIZE = 500
+
+
+def get_timeline_store():
+    return import_string(settings.TIMELINE_STORE)()
+
+
+class FanoutOnReadTimelineStore:
+    """Лента, вычисляемая при каждом чтении из таблицы подписок."""
+
+    def posts(self, user):
+        return Post.objects.for_feed().filter(
+            author__following__user=user
+        )
+
+    def paginator(self, user, per_page):
+        return CursorPaginator(self.posts(user), per_page)
+
+    def add_post(self, post):
+        pass
+
+    def follow(self, user_id, author_id):
+        pass
+
+    def unfollow(self, user_id, author_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорный вывод по TimelineEntry с подмешиванием постов,
+    которые не раскладывались по лентам.
+    """
+
+    def __init__(self, entries, extra_posts, per_page):
+        self.entries = entries.select_related(
+            'post__author', 'post__group'
+        ).order_by('-pub_date', '-post_id')
+        super().__init__(extra_posts, per_page)
+
+    def _fetch(self, key, backward, limit):
+        entries = self.entries
+        if key is not None:
+            entries = entries.filter(
+                self._seek(key, backward, ('pub_date', 'post_id'))
+            )
+        if backward:
+            entries = entries.reverse()
+        posts = {entry.post_id: entry.post for entry in entries[:limit]}
+        if self.object_list.query.is_empty():
+            return list(posts.values())
+        for post in super()._fetch(key, backward, limit):
+            posts.setdefault(post.id, post)
+        return sorted(
+            posts.values(),
+            key=self._get_key,
+            reverse=not backward
+        )[:limit]
+
+    def iterate(self, key, limit):
+        # Страница собирается из двух источников, поэтому читается целиком.
+        return iter(self._fetch(key, False, limit))
+
+
+class DatabaseTimelineStore(FanoutOnReadTimelineStore):
+    """Лента в таблице TimelineEntry с гибридным чтением."""
+
+    def __init__(self, fanout_limit=None):
+        if fanout_limit is None:
+            fanout_limit = settings.TIMELINE_FANOUT_LIMIT
+        self.fanout_limit = fanout_limit
+
+    def follower_count(self, author_id):
+        return UserStats.objects.filter(pk=author_id).values_list(
+            'follower_count', flat=True
+        ).first() or 0
+
+    def is_celebrity(self, author_id):
+        return self.follower_count(author_id) > self.fanout_limit
+
+    def read_posts(self, user):
+        """Посты из подписок, которых нет в ленте пользователя:
+        популярных авторов и старше разложенных при подписке.
+        """
+        follows = Follow.objects.filter(user=user).filter(
+            Q(author__stats__follower_count__gt=self.fanout_limit)
+            | Q(timeline_since__isnull=False)
+        ).values_list(
+            'author_id', 'author__stats__follower_count', 'timeline_since'
+        )
+        condition = Q()
+        for author_id, follower_count, since in follows:
+            if (follower_count or 0) > self.fanout_limit:
+                condition |= Q(author_id=author_id)
+            else:
+                condition |= Q(author_id=author_id, pub_date__lte=since)
+        if not condition:
+            return Post.objects.none()
+        return Post.objects.for_feed().filter(condition)
+
+    def paginator(self, user, per_page):
+        return TimelinePaginator(
+            TimelineEntry.objects.filter(user=user),
+            self.read_posts(user),
+            per_page
+        )
+
+    def _write(self, entries):
+        entries = iter(entries)
+        batch = list(islice(entries, BATCH_SIZE))
+        while batch:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = list(islice(entries, BATCH_SIZE))
+
+    def add_post(self, post):
+        if self.is_celebrity(post.author_id):
+            return
+        follower_ids = Follow.objects.filter(
+            author_id=post.author_id
+        ).values_list('user_id', flat=True)
+        self._write(
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post.id,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in follower_ids.iterator()
+        )
+
+    def followers(self, author_id):
+        return Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+
+    def backfill(self, user_ids, author_id):
+        """Раскладывает последние посты автора по лентам подписчиков
+        и запоминает в подписке, старше какой даты посты не разложены.
+        """
+        limit = settings.TIMELINE_BACKFILL_LIMIT
+        # Посты читаются один раз для всех подписчиков.
+        posts = list(Post.objects.filter(
+            author_id=author_id
+        ).order_by('-pub_date', '-id').values_list(
+            'id', 'pub_date'
+        )[:limit + 1])
+        since = posts[limit - 1][1] if len(posts) > limit else None
+        posts = posts[:limit]
+        self._write(
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for user_id in user_ids
+            for post_id, pub_date in posts
+        )
+        Follow.objects.filter(
+            user_id__in=user_ids, author_id=author_id
+        ).update(timeline_since=since)
+
+    def follow(self, user_id, author_id):
+        if not self.is_celebrity(author_id):
+            self.backfill([user_id], author_id)
+
+    def unfollow(self, user_id, author_id):
+        TimelineEntry.objects.filter(
+            user_id=user_id, author_id=author_id
+        ).delete()
+        if self.follower_count(author_id) == self.fanout_limit:
+            # Автор перестал быть популярным: его посты больше
+            # не подмешиваются при чтении, раскладываем их по лентам.
+            self.backfill(self.followers(author_id), author_id)
+
+    def rebuild(self):
+        """Заново раскладывает посты по лентам всех подписчиков."""
+        TimelineEntry.objects.all().delete()
+        author_ids = Follow.objects.exclude(
+            author__stats__follower_count__gt=self.fanout_limit
+        ).order_by('author_id').values_list('author_id', flat=True)
+        for author_id in list(author_ids.distinct()):
+            self.backfill(self.followers(author_id), author_id)
@@ -0,0 +1,136 @@
+"""Имена пользователей без запросов к auth_user.
+
+Ссылки на авторов и поиск автора по username в адресе используют
+словари id → пользователь и username → пользователь. Они хранятся
+в общем кеше и в LRU процесса; сигналы сбрасывают записи при изменении
+и удалении пользователя. LRU других процессов узнает об изменении
+только по истечении USER_CACHE_LOCAL_TIMEOUT секунд. Промахи читаются
+из default даже на страницах с реплики: отстающая реплика не должна
+попасть в кеш на сутки.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from core.routers import PRIMARY
+
+User = get_user_model()
+
+ID_PREFIX = 'user:'
+USERNAME_PREFIX = 'username:'
+TIMEOUT = 24 * 60 * 60
+FIELDS = ('id', 'username', 'first_name', 'last_name')
+
+
+class UserRef(namedtuple('UserRef', FIELDS)):
+    """Поля пользователя, нужные для ссылки на его профиль."""
+    __slots__ = ()
+
+    @property
+    def full_name(self):
+        return f'{self.first_name} {self.last_name}'.strip()
+
+    @property
+    def name(self):
+        return self.full_name or self.username
+
+    def as_user(self):
+        """Пользователь без запроса к базе; сохранять его нельзя."""
+        return User(**self._asdict())
+
+
+class LRUCache:
+    """Словарь процесса с вытеснением давно не читавшихся ключей."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    del self.entries[key]
+                    continue
+                self.entries.move_to_end(key)
+                found[key] = entry[0]
+        return found
+
+    def set_many(self, data):
+        expires = time.monotonic() + self.timeout
+        with self.lock:
+            for key, value in data.items():
+                self.entries[key] = (value, expires)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local = LRUCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_LOCAL_TIMEOUT)
+
+
+def _store(refs):
+    data = {}
+    for ref in refs:
+        data[ID_PREFIX + str(ref.id)] = ref
+        data[USERNAME_PREFIX + ref.username] = ref
+    local.set_many(data)
+    cache.set_many(data, TIMEOUT)
+
+
+def _lookup(prefix, values, field):
+    keys = {prefix + str(value): value for value in values}
+    found = local.get_many(keys)
+    missing = keys.keys() - found.keys()
+    if missing:
+        shared = cache.get_many(missing)
+        local.set_many(shared)
+        found.update(shared)
+        missing -= shared.keys()
+    if missing:
+        refs = [
+            UserRef(*row) for row in User.objects.using(PRIMARY).filter(**{
+                f'{field}__in': [keys[key] for key in missing]
+            }).values_list(*FIELDS)
+        ]
+        _store(refs)
+        found.update((prefix + str(getattr(ref, field)), ref) for ref in refs)
+    return {keys[key]: ref for key, ref in found.items()}
+
+
+def by_id(user_ids):
+    """UserRef по id; неизвестных id в словаре нет."""
+    return _lookup(ID_PREFIX, user_ids, 'id')
+
+
+def by_username(usernames):
+    """UserRef по username; неизвестных имен в словаре нет."""
+    return _lookup(USERNAME_PREFIX, usernames, 'username')
+
+
+def forget(user_id, *usernames):
+    keys = [ID_PREFIX + str(user_id)] + [
+        USERNAME_PREFIX + username for username in usernames if username
+    ]
+    local.delete_many(keys)
+    cache.delete_many(keys)
@@ -1,9 +1,314 @@
+from functools import wraps
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core import signing
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.views.decorators.http import condition
+
+from core.routers import using_replica
+
+from . import cache
+
+CURSOR_SALT = 'posts.cursor'
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+class CursorPaginator(Paginator):
+    """Постраничный вывод по ключу (keyset) вместо LIMIT/OFFSET.
+
+    Страница ищется по позиции последней записи предыдущей страницы,
+    поэтому стоимость запроса не зависит от глубины прокрутки,
+    а общее количество записей не считается.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id')):
+        self.ordering = ordering
+        super().__init__(object_list.order_by(*ordering), per_page)
+
+    def _get_key(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def encode_cursor(self, obj, direction):
+        key = [value.isoformat() if hasattr(value, 'isoformat') else value
+               for value in self._get_key(obj)]
+        return signing.dumps([direction] + key, salt=CURSOR_SALT)
+
+    def decode_cursor(self, cursor):
+        """Возвращает (направление, ключ) или None для битого курсора."""
+        try:
+            direction, *key = signing.loads(cursor, salt=CURSOR_SALT)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        if (direction not in (FORWARD, BACKWARD)
+                or len(key) != len(self.ordering)):
+            return None
+        field = self.ordering[0].lstrip('-')
+        if self.object_list.model._meta.get_field(field).get_internal_type() \
+                == 'DateTimeField':
+            key[0] = parse_datetime(key[0])
+            if key[0] is None:
+                return None
+        return direction, key
+
+    def _seek(self, key, backward, fields=None):
+        """Условие «строго после ключа» в порядке сортировки.
+
+        fields позволяет искать по колонкам другой таблицы с тем же ключом.
+        """
+        condition = Q()
+        for position in reversed(range(len(self.ordering))):
+            field = self.ordering[position]
+            descending = field.startswith('-')
+            name = fields[position] if fields else field.lstrip('-')
+            lookup = 'lt' if descending != backward else 'gt'
+            step = Q(**{f'{name}__{lookup}': key[position]})
+            if position < len(self.ordering) - 1:
+                step |= Q(**{name: key[position]}) & condition
+            condition = step
+        return condition
+
+    def page_queryset(self, key=None, backward=False):
+        """Объекты после ключа в направлении просмотра."""
+        queryset = self.object_list
+        if key is not None:
+            queryset = queryset.filter(self._seek(key, backward))
+        if backward:
+            queryset = queryset.reverse()
+        return queryset
+
+    def _fetch(self, key, backward, limit):
+        return list(self.page_queryset(key, backward)[:limit])
+
+    def iterate(self, key, limit):
+        """Объекты после ключа по одному, без загрузки страницы в память."""
+        return self.page_queryset(key)[:limit].iterator()
+
+    def cursor_page(self, cursor=None):
+        decoded = self.decode_cursor(cursor) if cursor else None
+        key, backward = None, False
+        if decoded is not None:
+            direction, key = decoded
+            backward = direction == BACKWARD
+        object_list = self._fetch(key, backward, self.per_page + 1)
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if backward:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, decoded is not None
+        page = self._get_page(object_list, None, self)
+        page.next_cursor = (
+            self.encode_cursor(object_list[-1], FORWARD)
+            if has_next and object_list else None
+        )
+        page.previous_cursor = (
+            self.encode_cursor(object_list[0], BACKWARD)
+            if has_previous and object_list else None
+        )
+        return page
+
+
+class ElidedPage(Page):
+
+    @property
+    def elided_page_range(self):
+        return list(self.paginator.get_elided_page_range(self.number))
+
+
+class ElidedPaginator(Paginator):
+    """Номера страниц окном вокруг текущей и число записей из счетчика.
+
+    count — число или функция без аргументов, например поддерживаемый
+    счетчик или approximate_count; None означает точный COUNT(*). Если
+    оценка больше настоящего числа, последние страницы просто пустые.
+    """
+    ELLIPSIS = '…'
+    on_each_side = 2
+    on_ends = 1
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        count = self._count() if callable(self._count) else self._count
+        return super().count if count is None else count
 
+    def _get_page(self, *args, **kwargs):
+        return ElidedPage(*args, **kwargs)
 
-def get_page_obj(obj_list, request):
-    paginator = Paginator(obj_list, settings.POST_PER_PAGE)
+    def get_elided_page_range(self, number=1):
+        """Номера страниц, где далекие от текущей заменены на ELLIPSIS."""
+        number = self.validate_number(number)
+        window = self.on_each_side
+        if self.num_pages <= 2 * (window + self.on_ends):
+            yield from self.page_range
+            return
+        if number > 1 + window + self.on_ends + 1:
+            yield from range(1, self.on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - window, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - window - self.on_ends - 1:
+            yield from range(number + 1, number + window + 1)
+            yield self.ELLIPSIS
+            yield from range(
+                self.num_pages - self.on_ends + 1, self.num_pages + 1
+            )
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+
+def table_estimate(queryset):
+    """Число строк таблицы по статистике планировщика или None."""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s', [table]
+            )
+        elif (connection.vendor == 'sqlite' and 'sqlite_stat1'
+                in connection.introspection.table_names(cursor)):
+            # Первое число stat — строки индекса, то есть таблицы.
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                [table]
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    return None if row is None else int(float(str(row[0]).split()[0]))
+
+
+def approximate_count(scope, queryset):
+    """Число записей для номеров страниц без COUNT(*) на каждый запрос.
+
+    Таблица без фильтра больше PAGINATOR_EXACT_COUNT_LIMIT строк
+    считается по статистике ANALYZE, остальное — точным COUNT(*).
+    Результат хранится в кеше по версии области scope.
+    """
+    def count():
+        if not queryset.query.where:
+            estimate = table_estimate(queryset)
+            if (estimate is not None
+                    and estimate > settings.PAGINATOR_EXACT_COUNT_LIMIT):
+                return estimate
+        return queryset.count()
+    # Число с отстающей реплики нельзя закрепить за новой версией.
+    store = not (using_replica() and cache.changed_recently(scope))
+    return cache.cached_count(scope, count, store)
+
+
+def get_page_obj(obj_list, request, cursor_paginator=None, count=None):
+    """Страница объектов: по курсору, либо по номеру для старых ссылок.
+
+    cursor_paginator заменяет курсорный постраничный вывод по obj_list,
+    например для ленты подписок, читаемой из отдельного хранилища.
+    count передается ElidedPaginator для вывода по номеру.
+    """
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if page_number is not None:
+        paginator = ElidedPaginator(
+            obj_list.order_by('-pub_date', '-id'), settings.POST_PER_PAGE,
+            count
+        )
+        page_obj = paginator.get_page(page_number)
+        page_obj.is_cursor = False
+        return page_obj
+    paginator = cursor_paginator or CursorPaginator(
+        obj_list, settings.POST_PER_PAGE
+    )
+    page_obj = paginator.cursor_page(request.GET.get('cursor'))
+    page_obj.is_cursor = True
     return page_obj
+
+
+def _version_scopes(request, scopes, kwargs):
+    if not hasattr(request, 'version_scopes'):
+        found = scopes(request, **kwargs)
+        # Ответ с отстающей реплики нельзя закрепить за новой версией.
+        if (found is not None and using_replica()
+                and cache.changed_recently(*found)):
+            found = None
+        request.version_scopes = found
+        # Версии до рендеринга: страница не попадет в кеш под более
+        # новой версией, чем ее данные.
+        if found is not None and getattr(request, 'page_cache', False):
+            request.page_cache_etag = cache.etag(*found)
+    return request.version_scopes
+
+
+def scopes_etag(request, found, per_user):
+    """ETag ответа versioned для найденных областей."""
+    vary_on = [request.get_full_path()]
+    if per_user:
+        vary_on.append(request.user.pk)
+    return cache.etag(*found, vary_on=vary_on)
+
+
+def scopes_last_modified(request, found, per_user):
+    """Last-Modified ответа versioned для найденных областей."""
+    # Дата не различает посетителей, поэтому вошедшим пользователям
+    # страница проверяется только по ETag.
+    if per_user and request.user.is_authenticated:
+        return None
+    return cache.last_modified(*found)
+
+
+def _etag(request, scopes, per_user, kwargs):
+    found = _version_scopes(request, scopes, kwargs)
+    if found is not None:
+        return scopes_etag(request, found, per_user)
+
+
+def _last_modified(request, scopes, per_user, kwargs):
+    if per_user and request.user.is_authenticated:
+        return None
+    found = _version_scopes(request, scopes, kwargs)
+    if found is not None:
+        return scopes_last_modified(request, found, per_user)
+
+
+def versioned(scopes, per_user=False):
+    """Условный GET по версиям областей кеша фрагментов.
+
+    scopes(request, **kwargs) возвращает области, от которых зависит
+    ответ, или None, если ответ нельзя проверить заранее. Совпавший
+    ETag или Last-Modified дает 304 без вызова представления.
+    per_user добавляет пользователя в ETag для страниц, которые
+    выглядят по-разному для разных посетителей.
+    """
+    def etag(request, **kwargs):
+        return _etag(request, scopes, per_user, kwargs)
+
+    def last_modified(request, **kwargs):
+        return _last_modified(request, scopes, per_user, kwargs)
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=etag, last_modified_func=last_modified
+        )(view)
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            # Кеш страниц проверяет сохраненную страницу так же.
+            request.version_per_user = per_user
+            response = conditional_view(request, *args, **kwargs)
+            # Страница с заглушками миниатюр изменится без смены версий,
+            # когда миниатюры будут готовы, поэтому ее нельзя проверять.
+            if getattr(request, 'response_incomplete', False):
+                del response['ETag']
+                del response['Last-Modified']
+            return response
+        return inner
+    return decorator
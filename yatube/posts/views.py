@@ -1,63 +1,209 @@
-from django.contrib.auth import get_user_model
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import require_POST
 
+from core.routers import pin_to_primary, read_from_replica
+
+from . import comment_buffer, follows, thumbnails, users
+from .api import serialize_comment
+from .counters import get_user_stats
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post
-from .utils import get_page_obj
+from .models import Comment, Group, GroupStats, Post
+from .search import SearchResults, get_search_backend, tokenize
+from .timeline import get_timeline_store
+from .utils import (CursorPaginator, ElidedPaginator, approximate_count,
+                    get_page_obj, versioned)
+
+
+def _page_object(request, queryset, **lookup):
+    """Объект страницы, общий для проверки свежести и представления."""
+    if not hasattr(request, 'page_object'):
+        request.page_object = get_object_or_404(queryset, **lookup)
+    return request.page_object
+
+
+def _group(request, slug):
+    return _page_object(request, Group, slug=slug)
+
 
-User = get_user_model()
+def _author(request, username):
+    if not hasattr(request, 'page_object'):
+        request.page_object = _user_ref(username).as_user()
+    return request.page_object
 
 
+def _user_ref(username):
+    ref = users.by_username([username]).get(username)
+    if ref is None:
+        raise Http404
+    return ref
+
+
+def _post(request, post_id):
+    return _page_object(
+        request, Post.objects.select_related('author__stats', 'group'),
+        pk=post_id
+    )
+
+
+@read_from_replica
+@versioned(lambda request: ('index',), per_user=True)
 def index(request):
-    post_list = Post.objects.select_related('group').all()
+    post_list = Post.objects.for_feed()
     context = {
-        'page_obj': get_page_obj(post_list, request),
+        'page_obj': get_page_obj(
+            post_list, request,
+            count=lambda: approximate_count('index', post_list)
+        ),
         'page': request.GET.get('page'),
+        'cursor': request.GET.get('cursor'),
+        'fragment_scope': 'index',
         'index': True,
     }
     return render(request, 'posts/index.html', context)
 
 
+@read_from_replica
+@versioned(
+    lambda request, slug: (f'group:{_group(request, slug).pk}',),
+    per_user=True
+)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = Post.objects.filter(group=group)
+    group = _group(request, slug)
+    post_list = Post.objects.for_feed().filter(group=group)
     context = {
         'group': group,
-        'page_obj': get_page_obj(post_list, request),
+        'page_obj': get_page_obj(
+            post_list, request,
+            count=lambda: GroupStats.objects.filter(group=group).values_list(
+                'post_count', flat=True
+            ).first()
+        ),
+        'page': request.GET.get('page'),
+        'cursor': request.GET.get('cursor'),
+        'fragment_scope': f'group:{group.pk}',
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@read_from_replica
+@versioned(lambda request: ('groups',), per_user=True)
+def group_index(request):
+    stats = GroupStats.objects.select_related('group').order_by(
+        '-post_count', 'group_id'
+    )
+    page_obj = ElidedPaginator(stats, settings.GROUPS_PER_PAGE).get_page(
+        request.GET.get('page')
+    )
+    authors = users.by_id({
+        author_id
+        for group_stats in page_obj
+        for author_id, _ in group_stats.top_author_counts()
+    })
+    for group_stats in page_obj:
+        group_stats.authors = [
+            (authors[author_id], count)
+            for author_id, count in group_stats.top_author_counts()
+            if author_id in authors
+        ]
+    return render(request, 'posts/groups.html', {'page_obj': page_obj})
+
+
+# Профиль показывает и число подписок автора, которое меняет
+# версию его области follow.
+@read_from_replica
+@versioned(
+    lambda request, username: (
+        f'profile:{_author(request, username).pk}',
+        f'follow:{_author(request, username).pk}',
+    ),
+    per_user=True
+)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    user = request.user if request.user.is_authenticated else None
-    following = Follow.objects.filter(
-        user=user,
-        author=author
-    ).exists()
-    post_list = Post.objects.filter(author=author)
+    author = _author(request, username)
+    post_list = Post.objects.for_feed().filter(author=author)
+    author_stats = get_user_stats(author)
     context = {
         'author': author,
-        'page_obj': get_page_obj(post_list, request),
-        'following': following
+        'author_stats': author_stats,
+        'page_obj': get_page_obj(
+            post_list, request, count=author_stats.post_count
+        ),
+        'page': request.GET.get('page'),
+        'cursor': request.GET.get('cursor'),
+        'fragment_scope': f'profile:{author.pk}',
     }
     return render(request, 'posts/profile.html', context)
 
 
+# Страница поста показывает число постов автора из области профиля.
+@read_from_replica
+@versioned(
+    lambda request, post_id: (
+        f'post:{post_id}', f'profile:{_post(request, post_id).author_id}'
+    ),
+    per_user=True
+)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = _post(request, post_id)
     form = CommentForm()
-    comments = Comment.objects.filter(post=post)
+    cursor = request.GET.get('comments')
     context = {
         'post': post,
+        'author_stats': get_user_stats(post.author),
+        'fragment_scope': f'post:{post.pk}',
         'form': form,
-        'comments': comments,
+        # Комментарии читаются, только если их фрагмента нет в кеше.
+        'comments': SimpleLazyObject(
+            lambda: _comment_page(post.pk, cursor)
+        ),
+        'comments_cursor': cursor,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def _comment_page(post_id, cursor):
+    paginator = CursorPaginator(
+        Comment.objects.filter(post_id=post_id),
+        settings.COMMENTS_PER_PAGE,
+        ('-created', '-id')
+    )
+    return paginator.cursor_page(cursor)
+
+
+@versioned(lambda request, post_id: (f'post:{post_id}',))
+def post_comments(request, post_id):
+    """Следующие страницы комментариев: HTML-фрагмент или JSON."""
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = _comment_page(post_id, request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [serialize_comment(comment) for comment in comments],
+            'next': comments.next_cursor,
+        })
+    return render(request, 'posts/includes/comments.html', {
+        'post_id': post_id,
+        'comments': comments,
+    })
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results = SearchResults(get_search_backend(), tokenize(query))
+    paginator = ElidedPaginator(results, settings.POST_PER_PAGE)
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -68,6 +214,7 @@ def post_create(request):
         new_post = form.save(commit=False)
         new_post.author_id = user.id
         new_post.save()
+        thumbnails.schedule(new_post)
         return redirect('posts:profile', username=user.username)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -85,6 +232,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id=post.pk)
     return render(request, 'posts/create_post.html', {'form': form,
                                                       'is_edit': True,
@@ -94,9 +243,29 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
+    if settings.COMMENT_WRITE_BEHIND:
+        return _buffer_comment(request, post_id)
+    return _save_comment(request, post_id)
+
+
+def _buffer_comment(request, post_id):
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    form = CommentForm(request.POST or None)
+    if form.is_valid():
+        comment_buffer.writer.add(Comment(
+            post_id=post_id,
+            author=request.user,
+            text=form.cleaned_data['text'],
+        ))
+        comment_buffer.writer.wait(request.user.pk, post_id)
+    return redirect('posts:post_detail', post_id=post_id)
+
+
+@transaction.atomic
+def _save_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
-    if form.is_valid:
+    if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
@@ -105,33 +274,62 @@ def add_comment(request, post_id):
 
 
 @login_required
+@read_from_replica
 def follow_index(request):
-    post_list = Post.objects.select_related('group').filter(
-        author__following__in=request.user.follower.all()
-    )
+    store = get_timeline_store()
     context = {
-        'page_obj': get_page_obj(post_list, request),
+        'page_obj': get_page_obj(
+            store.posts(request.user),
+            request,
+            store.paginator(request.user, settings.POST_PER_PAGE)
+        ),
         'follow': True
     }
     return render(request, 'posts/follow.html', context)
 
 
+def _follow_response(request, username, following, changed):
+    """JSON для запросов из скрипта, иначе возврат в профиль."""
+    if changed:
+        # Кнопка без скрипта подписывает запросом GET.
+        pin_to_primary(request)
+    if request.is_ajax():
+        return JsonResponse({
+            'username': username, 'following': following, 'changed': changed
+        })
+    return redirect('posts:profile', username=username)
+
+
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    user = request.user
-    if user == author:
-        return redirect('posts:profile', username=username)
-    Follow.objects.get_or_create(
-        user=user,
-        author=author
+    author_id = _user_ref(username).id
+    created = follows.follow(request.user.pk, [author_id])
+    return _follow_response(
+        request, username, author_id != request.user.pk, bool(created)
     )
-    return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
-    user = request.user
-    Follow.objects.filter(user=user, author=author).delete()
-    return redirect('posts:profile', username=username)
+    deleted = follows.unfollow(request.user.pk, [_user_ref(username).id])
+    return _follow_response(request, username, False, bool(deleted))
+
+
+@login_required
+@require_POST
+def follow_bulk(request):
+    """Подписка на список авторов одним запросом к базе."""
+    usernames = list(dict.fromkeys(request.POST.getlist('username')))
+    if len(usernames) > settings.FOLLOW_BULK_LIMIT:
+        return JsonResponse({
+            'error': f'Не больше {settings.FOLLOW_BULK_LIMIT} авторов'
+        }, status=400)
+    refs = users.by_username(usernames)
+    created = set(follows.follow(
+        request.user.pk, [ref.id for ref in refs.values()]
+    ))
+    return JsonResponse({
+        'followed': [name for name in usernames
+                     if name in refs and refs[name].id in created],
+        'missing': [name for name in usernames if name not in refs],
+    })
@@ -0,0 +1,11 @@
+// Подгружает следующую страницу комментариев вместо перехода по ссылке.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('[data-more-comments]');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.dataset.moreComments)
+    .then(function (response) { return response.text(); })
+    .then(function (html) { link.outerHTML = html; });
+});
@@ -0,0 +1,19 @@
+// Подписка и отписка без перехода на другую страницу.
+document.addEventListener('click', function (event) {
+  var button = event.target.closest('[data-follow]');
+  var token = document.cookie.match(/csrftoken=([^;]+)/);
+  if (!button || !token) {
+    return;
+  }
+  event.preventDefault();
+  fetch(button.href, {
+    method: 'POST',
+    headers: {'X-Requested-With': 'XMLHttpRequest', 'X-CSRFToken': token[1]}
+  })
+    .then(function (response) { return response.json(); })
+    .then(function (data) {
+      button.href = data.following ?
+        button.dataset.unfollow : button.dataset.follow;
+      button.textContent = data.following ? 'Отписаться' : 'Подписаться';
+    });
+});
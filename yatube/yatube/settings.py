@@ -11,6 +11,9 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
+
+from core.cache import cache_from_url
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -52,20 +55,24 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
-    'sorl.thumbnail',
+    'benchmarks.apps.BenchmarksConfig',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.PrimaryPinMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'posts.page_cache.PageCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
+TEST_RUNNER = 'core.runner.TestRunner'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
@@ -94,8 +101,23 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    # Локальная реплика: копия default, которую обновляет
+    # команда sync_replicas.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+    },
 }
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Псевдонимы из DATABASES, с которых читаются ленты, через запятую.
+# Пусто — все запросы идут в default.
+DATABASE_REPLICAS = [
+    alias for alias in os.environ.get('DATABASE_REPLICAS', '').split(',')
+    if alias
+]
+# Сколько секунд после изменения пользователь читает из default.
+REPLICA_STICKY_SECONDS = 5
 
 
 # Password validation
@@ -138,6 +160,15 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 POST_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+GROUPS_PER_PAGE = 20
+# Вывод по номерам страниц: таблицы больше этого числа строк
+# считаются по статистике ANALYZE, а не COUNT(*).
+PAGINATOR_EXACT_COUNT_LIMIT = 10000
+# Сколько секунд число записей используется после изменения данных.
+PAGINATOR_COUNT_MAX_AGE = 0
+FOLLOW_BULK_LIMIT = 100
+API_MAX_LIMIT = 100
 
 # Media
 
@@ -146,11 +177,74 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # CACHE
 
+# Кеш общий для всех процессов: по умолчанию файл SQLite во временном
+# каталоге, на нескольких машинах — memcached://host:port или
+# redis://host:port/0. Тесты получают свой кеш от core.runner.
+CACHE_URL = os.environ.get(
+    'CACHE_URL',
+    'sqlite://' + os.path.join(tempfile.gettempdir(), 'yatube-cache.sqlite3')
+)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': '127.0.0.1:11211',
+        **cache_from_url(CACHE_URL),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
     }
 }
+# Вероятностный пересчет до истечения срока (XFetch): чем больше,
+# тем раньше один из запросов обновляет значение.
+CACHE_EARLY_RECOMPUTE_BETA = 1.0
+# Сколько запрос ждет значение, которое уже считает другой запрос.
+CACHE_COMPUTE_WAIT = 2
+# Словарь пользователей в памяти процесса.
+USER_CACHE_SIZE = 10000
+USER_CACHE_LOCAL_TIMEOUT = 60
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Профилирование запросов: заголовок Server-Timing и отчет
+# admin/profiling/ по последним PROFILING_WINDOW запросам представления
+PROFILING_ENABLED = False
+PROFILING_WINDOW = 500
+
+# Лента подписок
+
+TIMELINE_STORE = 'posts.timeline.DatabaseTimelineStore'
+# Посты авторов с большим числом подписчиков не раскладываются по лентам
+# при публикации, а подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+# Подписка раскладывает в ленту только последние посты автора,
+# более старые читаются при прокрутке.
+TIMELINE_BACKFILL_LIMIT = 5 * POST_PER_PAGE
+
+# Одновременные комментарии сохраняются одной пачкой
+COMMENT_WRITE_BEHIND = False
+
+# Поиск: None — FTS5 на SQLite, иначе обратный индекс SearchTerm
+SEARCH_BACKEND = None
+SEARCH_RANK_WINDOW = 1000
+
+# Кеш фрагментов сбрасывается сигналами, поэтому может жить долго
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 6
+# Как часто счетчики попаданий процесса переносятся в общий кеш.
+FRAGMENT_STATS_FLUSH_SECONDS = 10
+FRAGMENT_CACHE_KINDS = (
+    'index', 'group', 'profile', 'post', 'follow', 'card', 'page'
+)
+# Целые страницы для анонимных посетителей.
+PAGE_CACHE_ENABLED = True
+# Сколько секунд после изменяющего запроса страницы идут мимо кеша.
+PAGE_CACHE_BYPASS_SECONDS = 5
+
+# Варианты картинок постов готовятся в фоне
+
+# Пропорции обрезки и ширины вариантов для srcset.
+POST_IMAGE_ASPECT = (960, 339)
+POST_IMAGE_WIDTHS = (320, 640, 960, 1920)
+# Форматы в порядке предпочтения; те, что не умеет сохранять Pillow,
+# пропускаются. JPEG нужен как запасной для <img>.
+POST_IMAGE_FORMATS = ('avif', 'webp', 'jpeg')
+POST_IMAGE_QUALITY = 80
+POST_IMAGE_SIZES = '(min-width: 992px) 960px, 100vw'
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_ROOT = os.path.join(MEDIA_ROOT, 'thumbnails')
+THUMBNAIL_URL = MEDIA_URL + 'thumbnails/'
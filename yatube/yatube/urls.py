@@ -18,6 +18,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import profiling_report
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
     path('group_list.html', include('posts.urls', namespace='posts')),
@@ -25,6 +27,7 @@ urlpatterns = [
     path('posts/', include('posts.urls', namespace='posts')),
     path('profile/', include('posts.urls', namespace='posts')),
     path('auth/', include('users.urls', namespace='users')),
+    path('admin/profiling/', profiling_report, name='profiling'),
     path('admin/', admin.site.urls),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),